@@ -5,8 +5,12 @@ import base64
 from PySide6.QtCore import QObject, Signal, QMimeData
 from PySide6.QtGui import QClipboard, QImage
 from PySide6.QtWidgets import QApplication
+from core.html_patterns import DATA_IMG_SRC_RE
 from core.repository import NoteRepository
 
+# Экранирование текста для вставки в <pre>: один проход вместо цепочки replace в html.escape
+_HTML_ESCAPE_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
 
 class ClipboardMonitor(QObject):
     """Мониторинг буфера обмена и автоматическое сохранение в дерево заметок."""
@@ -135,10 +139,6 @@ class ClipboardMonitor(QObject):
         """
         has_extracted_images = False
         
-        # Regex для поиска src="data:image/..."
-        # Группы: 1 - mime type, 2 - base64 data
-        pattern_b64 = re.compile(r'src=["\']?data:(image/[^;]+);base64,([^"\'\>\s]+)["\']?')
-        
         def replacer(match):
             nonlocal has_extracted_images
             mime_type = match.group(1)
@@ -158,7 +158,7 @@ class ClipboardMonitor(QObject):
                 print(f"Error saving clipboard image from HTML: {e}")
                 return match.group(0)
 
-        new_html = pattern_b64.sub(replacer, html)
+        new_html = DATA_IMG_SRC_RE.sub(replacer, html)
         return new_html, has_extracted_images
 
     def _on_clipboard_changed(self):
@@ -244,10 +244,9 @@ class ClipboardMonitor(QObject):
             att_id = self.repo.add_attachment(time_node_id, "clipboard_image.png", image_data, "image/png")
             # Если есть текст, добавляем его перед картинкой
             if has_text:
-                from html import escape
                 final_html_to_save = (
                     '<pre style="white-space: pre-wrap; font-family: inherit; margin: 0;">'
-                    f"{escape(text_content)}"
+                    f"{text_content.translate(_HTML_ESCAPE_TABLE)}"
                     "</pre>"
                     f'<br/><img src="noteimg://{att_id}" />'
                 )
@@ -257,10 +256,9 @@ class ClipboardMonitor(QObject):
 
         # ПРИОРИТЕТ В: Только текст (если HTML был пустой или мусорный, и нет картинки)
         if not saved_something and has_text:
-            from html import escape
             final_html_to_save = (
                 '<pre style="white-space: pre-wrap; font-family: inherit; margin: 0;">'
-                f"{escape(text_content)}"
+                f"{text_content.translate(_HTML_ESCAPE_TABLE)}"
                 "</pre>"
             )
             saved_something = True
@@ -0,0 +1,6 @@
+"""Общие регулярные выражения для разбора HTML заметок."""
+import re
+
+# src="data:image/..." во вставленном или скопированном HTML
+# Группы: 1 - mime type, 2 - base64 data
+DATA_IMG_SRC_RE = re.compile(r'src=["\']?data:(image/[^;]+);base64,([^"\'\>\s]+)["\']?')
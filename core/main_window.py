@@ -1,7 +1,7 @@
 import sys
 
-from PySide6.QtCore import Qt, QEvent, QUrl
-from PySide6.QtGui import QTextDocument, QKeySequence, QShortcut, QImage
+from PySide6.QtCore import Qt, QEvent
+from PySide6.QtGui import QKeySequence, QShortcut
 from PySide6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -247,15 +247,20 @@ class MainWindow(
             selected_image = images[0]
         else:
             # Открываем диалог выбора
-            dlg = ImageSelectionDialog(images, self)
+            dlg = ImageSelectionDialog(images, self.repo, self)
             if dlg.exec():
                 selected_image = dlg.selected_image
 
         if not selected_image:
             return
 
-        # selected_image = (id, note_id, name, bytes, mime)
-        att_id, _, name, img_bytes, mime = selected_image
+        # selected_image = (id, note_id, name, mime, length) — байты подгружаем только для выбранной картинки
+        att_id, _, name, mime, _ = selected_image
+        att_data = self.repo.get_attachment(att_id)
+        img_bytes = att_data[3] if att_data else None
+        if not img_bytes:
+            QMessageBox.warning(self, "Ошибка", "Не удалось загрузить изображение.")
+            return
 
         # Создаем временный файл
         ext = name.split(".")[-1] if "." in name else "png"
@@ -488,12 +493,7 @@ class MainWindow(
             # Раньше setHtml() выполнялся ДО addResource().
             # Тогда QTextDocument строился layout с placeholder-иконками,
             # и размеры картинок "подхватывались" только при повторном открытии заметки.
-            attachments = self.repo.get_attachments(note_id)
-            doc = self.editor.document()
-            for att_id, name, img_bytes, mime in attachments:
-                if img_bytes:
-                    image = QImage.fromData(img_bytes)
-                    doc.addResource(QTextDocument.ImageResource, QUrl(f"noteimg://{att_id}"), image)
+            self.editor.preload_note_images(note_id)
 
             self.editor.setHtml(body_html or "")
 
@@ -610,12 +610,7 @@ class MainWindow(
         # Важно: зарегистрировать ресурсы ДО setHtml, иначе document/layout
         # сначала строится с placeholder-иконками (треугольники), а размеры
         # картинок учитываются только при повторном чтении.
-        attachments = self.repo.get_attachments(self.current_note_id)
-        doc = self.editor.document()
-        for att_id, name, img_bytes, mime in attachments:
-            if img_bytes:
-                image = QImage.fromData(img_bytes)
-                doc.addResource(QTextDocument.ImageResource, QUrl(f"noteimg://{att_id}"), image)
+        self.editor.preload_note_images(self.current_note_id)
 
         self.editor.setHtml(body_html or "")
 
@@ -1,11 +1,143 @@
 from datetime import datetime
 import sys
-from PySide6.QtCore import QBuffer, QByteArray, QIODevice, Signal, QUrl, QMimeData, Qt
-from PySide6.QtGui import QImage, QTextDocument, QTextCursor, QTextCharFormat, QKeyEvent
+from PySide6.QtCore import (
+    QBuffer,
+    QByteArray,
+    QIODevice,
+    QObject,
+    QRunnable,
+    QThreadPool,
+    Signal,
+    QUrl,
+    QMimeData,
+    Qt,
+)
+from PySide6.QtGui import QImage, QPixmap, QPixmapCache, QTextDocument, QTextCursor, QTextCharFormat, QKeyEvent
 from PySide6.QtWidgets import QTextEdit, QApplication
 import re
 import base64
 
+from core.html_patterns import DATA_IMG_SRC_RE
+
+_NOTEIMG_PREFIX = "noteimg://"
+
+# src="noteimg://<id>" в HTML (id может быть нормализован Qt в IPv4-вид)
+_NOTEIMG_SRC_RE = re.compile(r'src=["\']?noteimg://([0-9\.]+)["\']?')
+
+# Лимит QPixmapCache для картинок заметок, КБ
+_PIXMAP_CACHE_LIMIT_KB = 51200
+
+# Ленивые кеши для симуляции Ctrl+V (см. _copy_and_paste_clipboard_note)
+_WIN32_PASTE_INPUTS = None
+_XDO = None
+
+
+def _win32_paste_inputs():
+    """Массив INPUT для SendInput: Ctrl↓ V↓ V↑ Ctrl↑. Возвращает (inputs, sizeof(INPUT))."""
+    global _WIN32_PASTE_INPUTS
+    if _WIN32_PASTE_INPUTS is None:
+        import ctypes
+        from ctypes import wintypes
+
+        VK_CONTROL = 0x11
+        VK_V = 0x56
+        INPUT_KEYBOARD = 1
+        KEYEVENTF_KEYUP = 0x0002
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [
+                ("wVk", wintypes.WORD),
+                ("wScan", wintypes.WORD),
+                ("dwFlags", wintypes.DWORD),
+                ("time", wintypes.DWORD),
+                ("dwExtraInfo", ctypes.c_size_t),
+            ]
+
+        # MOUSEINPUT нужен только для корректного размера union (sizeof(INPUT))
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [
+                ("dx", wintypes.LONG),
+                ("dy", wintypes.LONG),
+                ("mouseData", wintypes.DWORD),
+                ("dwFlags", wintypes.DWORD),
+                ("time", wintypes.DWORD),
+                ("dwExtraInfo", ctypes.c_size_t),
+            ]
+
+        class _INPUTUNION(ctypes.Union):
+            _fields_ = [("ki", KEYBDINPUT), ("mi", MOUSEINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _fields_ = [("type", wintypes.DWORD), ("u", _INPUTUNION)]
+
+        def key(vk, flags):
+            return INPUT(type=INPUT_KEYBOARD, u=_INPUTUNION(ki=KEYBDINPUT(wVk=vk, dwFlags=flags)))
+
+        inputs = (INPUT * 4)(
+            key(VK_CONTROL, 0),
+            key(VK_V, 0),
+            key(VK_V, KEYEVENTF_KEYUP),
+            key(VK_CONTROL, KEYEVENTF_KEYUP),
+        )
+        _WIN32_PASTE_INPUTS = (inputs, ctypes.sizeof(INPUT))
+    return _WIN32_PASTE_INPUTS
+
+
+def _xdo_handle():
+    """Открыть libxdo через ctypes (один раз). Возвращает (lib, xdo_t*) или None, если библиотеки нет."""
+    global _XDO
+    if _XDO is None:
+        _XDO = False
+        try:
+            import ctypes
+            import ctypes.util
+
+            lib_name = ctypes.util.find_library("xdo")
+            if lib_name:
+                lib = ctypes.CDLL(lib_name)
+                lib.xdo_new.restype = ctypes.c_void_p
+                lib.xdo_new.argtypes = [ctypes.c_char_p]
+                lib.xdo_send_keysequence_window.argtypes = [
+                    ctypes.c_void_p,
+                    ctypes.c_ulong,
+                    ctypes.c_char_p,
+                    ctypes.c_uint,
+                ]
+                handle = lib.xdo_new(None)
+                if handle:
+                    _XDO = (lib, handle)
+        except Exception as e:
+            print(f"libxdo unavailable: {e}")
+    return _XDO or None
+
+
+class _ImageEncodeSignals(QObject):
+    finished = Signal(int)  # id вложения
+
+
+class _ImageEncodeTask(QRunnable):
+    """Кодирование QImage (PNG/JPEG) в пуле потоков (результат забирает GUI-поток)"""
+
+    def __init__(self, att_id: int, image: QImage, fmt: str = "PNG"):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.att_id = att_id
+        self.image = image
+        self.fmt = fmt
+        self.result = b""
+        self.signals = _ImageEncodeSignals()
+
+    def run(self):
+        ba = QByteArray()
+        # Резервируем место заранее (~1/4 от несжатого размера), чтобы буфер не перевыделялся по ходу записи
+        ba.reserve(max(64 * 1024, self.image.sizeInBytes() // 4))
+        buff = QBuffer(ba)
+        buff.open(QIODevice.WriteOnly)
+        self.image.save(buff, self.fmt)
+        buff.close()
+        self.result = ba.data()
+        self.signals.finished.emit(self.att_id)
+
 
 class NoteEditor(QTextEdit):
     """Кастомный редактор заметок с поддержкой вставки изображений"""
@@ -17,10 +149,19 @@ class NoteEditor(QTextEdit):
         self.repo = None
         self.current_note_id = None
         self.main_window = None  # Ссылка на главное окно
+        # Принадлежность текущей заметки ветке 'Буфер обмена' (вычисляется при смене заметки)
+        self._is_clipboard_cached = False
+        # Вставленные картинки, которые ещё кодируются в фоне: id вложения -> _ImageEncodeTask
+        self._pending_images = {}
+        self._image_pool = QThreadPool(self)
 
     def set_context(self, repo):
         """Установить контекст для работы с БД"""
         self.repo = repo
+        self._is_clipboard_cached = False
+        # Готовые QPixmap картинок переживают переключение заметок и повторную раскладку
+        if QPixmapCache.cacheLimit() < _PIXMAP_CACHE_LIMIT_KB:
+            QPixmapCache.setCacheLimit(_PIXMAP_CACHE_LIMIT_KB)
 
     def set_current_note_id(self, note_id: int | None):
         """Задать id заметки, содержимое которой сейчас находится в редакторе"""
@@ -29,9 +170,10 @@ class NoteEditor(QTextEdit):
         # Обновляем read-only статус для заметок из буфера обмена
         if self.repo and note_id:
             is_clipboard = self.repo.is_clipboard_note(note_id)
-            self.setReadOnly(is_clipboard)
         else:
-            self.setReadOnly(False)
+            is_clipboard = False
+        self._is_clipboard_cached = is_clipboard
+        self.setReadOnly(is_clipboard)
 
     def set_main_window(self, window):
         """Установить ссылку на главное окно"""
@@ -57,29 +199,58 @@ class NoteEditor(QTextEdit):
             if not att_id:
                 return super().loadResource(resource_type, url)
             
-            try:
-                # Загружаем вложение из БД
-                att_data = self.repo.get_attachment(att_id)
-                if att_data:
-                    _, _, name, img_bytes, mime = att_data
-                    if img_bytes:
-                        # Создаём QImage из байтов
-                        image = QImage.fromData(img_bytes)
-                        if not image.isNull():
-                            # Регистрируем ресурс в документе для последующего использования
-                            self.document().addResource(QTextDocument.ImageResource, url, image)
-                            return image
-            except Exception as e:
-                print(f"Error loading image resource {url.toString()}: {e}")
-        
+            pixmap = self._load_attachment_pixmap(url, att_id)
+            if pixmap is not None:
+                return pixmap
+
         # Для остальных типов ресурсов используем стандартное поведение
         return super().loadResource(resource_type, url)
 
+    def _load_attachment_pixmap(self, url: QUrl, att_id: int):
+        """Получить картинку вложения (QPixmapCache или БД) и зарегистрировать её в документе.
+
+        Возвращает QPixmap или None.
+        """
+        key = url.toString()
+        pixmap = QPixmap()
+        if QPixmapCache.find(key, pixmap):
+            self.document().addResource(QTextDocument.ImageResource, url, pixmap)
+            return pixmap
+
+        try:
+            image = None
+            # Загружаем вложение из БД
+            att_data = self.repo.get_attachment(att_id)
+            if att_data:
+                _, _, name, img_bytes, mime = att_data
+                if img_bytes:
+                    # Создаём QImage из байтов
+                    image = QImage.fromData(img_bytes)
+
+            if image is not None and not image.isNull():
+                # Храним как QPixmap: при отрисовке не нужна повторная конвертация QImage -> QPixmap
+                pixmap = QPixmap.fromImage(image)
+                QPixmapCache.insert(key, pixmap)
+                # Регистрируем ресурс в документе для последующего использования
+                self.document().addResource(QTextDocument.ImageResource, url, pixmap)
+                return pixmap
+        except Exception as e:
+            print(f"Error loading image resource {url.toString()}: {e}")
+        return None
+
+    def preload_note_images(self, note_id: int):
+        """Зарегистрировать картинки заметки в документе до setHtml().
+
+        BLOB читаются только для картинок, которых нет в QPixmapCache.
+        """
+        if not self.repo or not note_id:
+            return
+        for meta in self.repo.get_attachments_meta(note_id):
+            self._load_attachment_pixmap(QUrl(f"noteimg://{meta[0]}"), meta[0])
+
     def _is_clipboard_note(self):
-        """Проверить, является ли текущая заметка из ветки 'Буфер обмена'"""
-        if not self.repo or not self.current_note_id:
-            return False
-        return self.repo.is_clipboard_note(self.current_note_id)
+        """Проверить, является ли текущая заметка из ветки 'Буфер обмена' (без запроса к БД)"""
+        return self._is_clipboard_cached
 
     def _copy_and_paste_clipboard_note(self):
         """
@@ -88,18 +259,30 @@ class NoteEditor(QTextEdit):
         2. Сворачивает приложение в трей
         3. Выполняет вставку Ctrl+V в активное окно
         """
-        # Выбираем все содержимое
-        cursor = self.textCursor()
-        cursor.select(QTextCursor.Document)
-        self.setTextCursor(cursor)
-        
-        # Копируем в буфер обмена
-        self.copy()
-        
-        # Сбрасываем выделение
-        cursor.clearSelection()
-        cursor.movePosition(QTextCursor.Start)
-        self.setTextCursor(cursor)
+        # Картинки в тексте представлены символом U+FFFC
+        if "\ufffc" in self.document().toRawText():
+            # Есть картинки: полный путь через выделение и createMimeDataFromSelection
+            # (noteimg:// -> base64 для внешних приложений)
+            cursor = self.textCursor()
+            cursor.select(QTextCursor.Document)
+            self.setTextCursor(cursor)
+
+            # Копируем в буфер обмена
+            self.copy()
+
+            # Сбрасываем выделение
+            cursor.clearSelection()
+            cursor.movePosition(QTextCursor.Start)
+            self.setTextCursor(cursor)
+        else:
+            # Быстрый путь: без выделения всего документа и лишней перерисовки.
+            # Заметка буфера read-only, поэтому её HTML в БД совпадает с содержимым редактора
+            mime = QMimeData()
+            mime.setText(self.toPlainText())
+            row = self.repo.get_note(self.current_note_id) if self.repo and self.current_note_id else None
+            if row and row[3]:
+                mime.setHtml(row[3])
+            QApplication.clipboard().setMimeData(mime)
         
         # Сворачиваем приложение в трей
         if self.main_window:
@@ -110,41 +293,27 @@ class NoteEditor(QTextEdit):
         
         # Выполняем вставку через симуляцию Ctrl+V
         try:
+            import time
+
+            # Небольшая задержка чтобы другое окно стало активным
+            time.sleep(0.1)
+
             if sys.platform == 'win32':
                 import ctypes
-                import time
-                
-                # Небольшая задержка чтобы другое окно стало активным
-                time.sleep(0.1)
-                
-                # Симуляция Ctrl+V
-                VK_CONTROL = 0x11
-                VK_V = 0x56
-                KEYEVENTF_KEYUP = 0x0002
-                
-                user32 = ctypes.windll.user32
-                
-                # Нажатие Ctrl
-                user32.keybd_event(VK_CONTROL, 0, 0, 0)
-                time.sleep(0.05)
-                
-                # Нажатие V
-                user32.keybd_event(VK_V, 0, 0, 0)
-                time.sleep(0.05)
-                
-                # Отпускание V
-                user32.keybd_event(VK_V, 0, KEYEVENTF_KEYUP, 0)
-                time.sleep(0.05)
-                
-                # Отпускание Ctrl
-                user32.keybd_event(VK_CONTROL, 0, KEYEVENTF_KEYUP, 0)
+
+                # Вся последовательность Ctrl+V уходит одним вызовом SendInput, без пауз между клавишами
+                inputs, input_size = _win32_paste_inputs()
+                ctypes.windll.user32.SendInput(len(inputs), inputs, input_size)
             else:
-                # Для Linux/Mac можно использовать xdotool или другие инструменты
-                import subprocess
-                import time
-                time.sleep(0.1)
-                # xdotool для Linux
-                subprocess.run(['xdotool', 'key', 'ctrl+v'], check=False)
+                xdo = _xdo_handle()
+                if xdo:
+                    # libxdo загружен один раз: без fork/exec на каждую вставку
+                    lib, handle = xdo
+                    lib.xdo_send_keysequence_window(handle, 0, b"ctrl+v", 12000)
+                else:
+                    # Для Linux/Mac без libxdo используем xdotool
+                    import subprocess
+                    subprocess.run(['xdotool', 'key', 'ctrl+v'], check=False)
         except Exception as e:
             print(f"Error simulating paste: {e}")
 
@@ -159,10 +328,8 @@ class NoteEditor(QTextEdit):
                 return
             
             # Стандартное поведение для обычных заметок
-            # Вставляем новую строку через insertHtml для консистентности
-            cursor = self.textCursor()
-            cursor.insertHtml("<br/>")
-            self.setTextCursor(cursor)
+            # Вставляем разрыв строки (U+2028): без HTML-парсера, в toHtml() сериализуется как <br />
+            self.textCursor().insertText("\u2028")
             event.accept()
             return
         
@@ -172,23 +339,19 @@ class NoteEditor(QTextEdit):
     def _parse_id_from_name(self, name: str) -> int | None:
         """Извлечение числового ID из URL (поддержка формата IPv4 для Qt)"""
         # Удаляем схему
-        clean = name.replace("noteimg://", "")
-        
-        # 1. Пробуем простое число
-        try:
-            return int(clean)
-        except ValueError:
-            pass
-            
-        # 2. Пробуем IPv4 (Qt может нормализовать noteimg://123 -> noteimg://0.0.0.123)
-        if clean.count('.') == 3:
-            try:
-                parts = list(map(int, clean.split('.')))
-                if len(parts) == 4:
-                    return (parts[0] << 24) | (parts[1] << 16) | (parts[2] << 8) | parts[3]
-            except ValueError:
-                pass
-                
+        s = name[len(_NOTEIMG_PREFIX):] if name.startswith(_NOTEIMG_PREFIX) else name
+
+        # 1. Простое число — основной случай, без исключений
+        if s.isascii() and s.isdigit():
+            return int(s)
+
+        # 2. IPv4 (Qt может нормализовать noteimg://123 -> noteimg://0.0.0.123)
+        if "." in s and s.isascii():
+            parts = s.split(".", 3)
+            if len(parts) == 4 and all(p.isdigit() for p in parts):
+                a, b, c, d = map(int, parts)
+                return (a << 24) | (b << 16) | (c << 8) | d
+
         return None
 
     def createMimeDataFromSelection(self):
@@ -225,33 +388,33 @@ class NoteEditor(QTextEdit):
         # 2. Обработка HTML: Конвертация внутренних ссылок noteimg:// в Base64 для внешних приложений (Word, Browser)
         if mime.hasHtml() and self.repo:
             html = mime.html()
-            # Regex для поиска src="noteimg://..."
-            pattern = re.compile(r'src=["\']?noteimg://([0-9\.]+)["\']?')
-            
-            def replacer(match):
-                full_match = match.group(0)
-                raw_id = match.group(1)
-                
-                att_id = self._parse_id_from_name(f"noteimg://{raw_id}")
-                if not att_id:
-                    return full_match
-                
+
+            # Первый проход: собираем ID всех картинок и загружаем их одним запросом
+            raw_to_id = {}
+            for raw_id in _NOTEIMG_SRC_RE.findall(html):
+                if raw_id not in raw_to_id:
+                    raw_to_id[raw_id] = self._parse_id_from_name(f"noteimg://{raw_id}")
+
+            data_uris = {}
+            ids = [att_id for att_id in raw_to_id.values() if att_id]
+            if ids:
                 try:
-                    att_data = self.repo.get_attachment(att_id)
-                    if att_data:
-                        _, _, _, img_bytes, mime_type = att_data
+                    for att_id, img_bytes, mime_type in self.repo.get_attachments_by_ids(ids):
                         if img_bytes:
                             # Конвертация в Base64
                             b64_str = base64.b64encode(img_bytes).decode('utf-8')
-                            if not mime_type: mime_type = "image/png"
-                            # Заменяем на data URI
-                            return f'src="data:{mime_type};base64,{b64_str}"'
+                            data_uris[att_id] = f"data:{mime_type or 'image/png'};base64,{b64_str}"
                 except Exception as e:
                     print(f"Error embedding image for clipboard: {e}")
-                
-                return full_match
 
-            new_html = pattern.sub(replacer, html)
+            # Второй проход: заменяем ссылки на data URI
+            def replacer(match):
+                data_uri = data_uris.get(raw_to_id.get(match.group(1)))
+                if not data_uri:
+                    return match.group(0)
+                return f'src="{data_uri}"'
+
+            new_html = _NOTEIMG_SRC_RE.sub(replacer, html)
             mime.setHtml(new_html)
                             
         return mime
@@ -272,8 +435,7 @@ class NoteEditor(QTextEdit):
             is_modified = False
             
             # A. Обработка noteimg:// (если скопировано внутри старой версии или без конвертации)
-            pattern_noteimg = re.compile(r'src=["\']?noteimg://([0-9\.]+)["\']?')
-            matches_noteimg = pattern_noteimg.findall(current_html)
+            matches_noteimg = _NOTEIMG_SRC_RE.findall(current_html)
             
             if matches_noteimg:
                 id_map = {}
@@ -309,13 +471,11 @@ class NoteEditor(QTextEdit):
                         if old in id_map:
                             return full.replace(f"noteimg://{old}", f"noteimg://{id_map[old]}")
                         return full
-                    current_html = pattern_noteimg.sub(noteimg_replacer, current_html)
+                    current_html = _NOTEIMG_SRC_RE.sub(noteimg_replacer, current_html)
                     is_modified = True
 
             # B. Обработка data:image/base64 (вставка из Word, браузера или после createMimeData)
-            pattern_b64 = re.compile(r'src=["\']?data:(image/[^;]+);base64,([^"\'\>\s]+)["\']?')
-            
-            if pattern_b64.search(current_html):
+            if DATA_IMG_SRC_RE.search(current_html):
                 def b64_replacer(match):
                     nonlocal is_modified
                     mime_type = match.group(1)
@@ -338,7 +498,7 @@ class NoteEditor(QTextEdit):
                         print(f"Error importing base64 image: {e}")
                         return match.group(0)
 
-                current_html = pattern_b64.sub(b64_replacer, current_html)
+                current_html = DATA_IMG_SRC_RE.sub(b64_replacer, current_html)
             
             if is_modified:
                 new_source = QMimeData()
@@ -353,47 +513,99 @@ class NoteEditor(QTextEdit):
         if source.hasImage() and self.repo and self.current_note_id:
             image = source.imageData()
             if isinstance(image, QImage):
-                ba = QByteArray()
-                buff = QBuffer(ba)
-                buff.open(QIODevice.WriteOnly)
-                image.save(buff, "PNG")
-                img_bytes = ba.data()
+                # Кодирование крупного скриншота не блокирует GUI: строку вложения создаём
+                # сразу (без данных) и вставляем noteimg://<id> с QImage в памяти, а байты
+                # записываем после кодирования. Документ потом не правится, поэтому в стеке
+                # отмены остаётся только сама вставка
+                formats = source.formats()
+                if "image/jpeg" in formats and "image/png" not in formats:
+                    # Источник отдаёт только JPEG — не тратим время на тяжёлый PNG deflate
+                    fmt, mime, ext = "JPEG", "image/jpeg", "jpg"
+                else:
+                    fmt, mime, ext = "PNG", "image/png", "png"
 
-                name = f"pasted_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                att_id = self.repo.add_attachment(self.current_note_id, name, img_bytes, "image/png")
+                name = f"pasted_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{ext}"
+                try:
+                    att_id = self.repo.add_attachment(self.current_note_id, name, None, mime)
+                except Exception as e:
+                    print(f"Error saving pasted image: {e}")
+                    return
+                task = _ImageEncodeTask(att_id, image, fmt)
+                task.signals.finished.connect(self._on_image_encoded)
+                self._pending_images[att_id] = task
 
-                url = QUrl(f"noteimg://{att_id}")
+                url = QUrl(f"{_NOTEIMG_PREFIX}{att_id}")
                 self.document().addResource(QTextDocument.ImageResource, url, image)
                 self.textCursor().insertHtml(f'<img src="{url.toString()}" />')
+                self._image_pool.start(task)
                 return
 
         super().insertFromMimeData(source)
     
+    def _on_image_encoded(self, att_id: int):
+        """Записать закодированную картинку во вложение, созданное при вставке"""
+        task = self._pending_images.pop(att_id, None)
+        if task is None or not self.repo:
+            return  # Уже обработано в flush_pending_images()
+
+        try:
+            self.repo.set_attachment_bytes(att_id, task.result)
+        except Exception as e:
+            print(f"Error saving pasted image: {e}")
+
+    def flush_pending_images(self):
+        """Дождаться фонового кодирования вставленных картинок и записать их в БД.
+
+        Вызывается при сохранении заметки и перед чтением вложений, а не на каждый toHtml().
+        """
+        if not self._pending_images:
+            return
+        self._image_pool.waitForDone()
+        for att_id in list(self._pending_images):
+            self._on_image_encoded(att_id)
+
     def get_images_in_content(self):
-        """Возвращает список изображений, присутствующих в тексте заметки"""
+        """Возвращает метаданные изображений, присутствующих в тексте заметки.
+
+        Элементы списка: (id, note_id, name, mime, length) — без BLOB,
+        байты загружаются отдельно через repo.get_attachment() по требованию.
+        """
         images = []
         if not self.repo or not self.current_note_id:
             return images
 
-        # Получаем HTML содержимое
-        html = self.toHtml()
-        
-        # Regex для поиска src="noteimg://..."
-        pattern_noteimg = re.compile(r'src=["\']?noteimg://([0-9\.]+)["\']?')
-        pattern_noteimg = re.compile(r'src=["\']?noteimg://([0-9\.]+)["\']?')
-        matches_noteimg = pattern_noteimg.findall(html)
-        
-        processed_ids = set()
-        for raw_id in matches_noteimg:
-            if raw_id in processed_ids: continue
-            
-            att_id = self._parse_id_from_name(f"noteimg://{raw_id}")
-            if att_id:
-                processed_ids.add(raw_id)
-                # Получаем данные из репозитория
-                att_data = self.repo.get_attachment(att_id)
-                if att_data:
-                    # att_data = (id, note_id, name, bytes, mime)
-                    images.append(att_data)
-        
+        self.flush_pending_images()
+
+        # Ссылки на картинки берём из форматов фрагментов документа — без сериализации в HTML
+        referenced = []
+        seen = set()
+        block = self.document().begin()
+        while block.isValid():
+            it = block.begin()
+            while not it.atEnd():
+                fmt = it.fragment().charFormat()
+                if fmt.isImageFormat():
+                    name = fmt.toImageFormat().name()
+                    if name.startswith(_NOTEIMG_PREFIX):
+                        att_id = self._parse_id_from_name(name)
+                        if att_id and att_id not in seen:
+                            seen.add(att_id)
+                            referenced.append(att_id)
+                it += 1
+            block = block.next()
+
+        if not referenced:
+            return images
+
+        # Метаданные вложений заметки одним запросом (без загрузки BLOB)
+        metas = {row[0]: row for row in self.repo.get_attachments_meta(self.current_note_id)}
+        for att_id in referenced:
+            # att_meta = (id, note_id, name, mime, length)
+            att_meta = metas.get(att_id)
+            if att_meta is None:
+                # Ссылка на вложение другой заметки
+                att_meta = self.repo.get_attachment_meta(att_id)
+            if att_meta:
+                images.append(att_meta)
+
         return images
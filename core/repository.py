@@ -1,18 +1,161 @@
+import hashlib
+import os
 import sqlite3
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
+# Запросы горячих путей (автосохранение, выбор заметки, состояние). Один и тот же текст SQL
+# позволяет sqlite3 брать уже подготовленный statement из кеша соединения
+_SQL_GET_NOTE = "SELECT id, parent_id, title, body_html, cursor_position, updated_at FROM notes WHERE id=?"
+# Обновление только при реальных изменениях: проверка «грязности» выполняется в WHERE
+_SQL_UPDATE_NOTE = """
+    UPDATE notes SET title=?, body_html=?, cursor_position=?, updated_at=datetime('now', 'localtime')
+    WHERE id=? AND (title IS NOT ? OR IFNULL(body_html, '') IS NOT ? OR IFNULL(cursor_position, 0) IS NOT ?)
+"""
+_SQL_GET_TITLE_PATH = "SELECT title, path FROM notes WHERE id=?"
+_SQL_GET_ATTACHMENTS = "SELECT id, name, bytes, mime, file_path FROM attachments WHERE note_id=? AND kind='image'"
+_SQL_GET_ATTACHMENT = "SELECT id, note_id, name, bytes, mime, file_path FROM attachments WHERE id=?"
+_SQL_GET_ATTACHMENT_META = (
+    "SELECT id, note_id, name, mime, IFNULL(length(bytes), size) FROM attachments WHERE id=?"
+)
+_SQL_SET_STATE = "INSERT OR REPLACE INTO state(key, value) VALUES (?, ?)"
+
+# Таблица состояния; value без TEXT-affinity: числа, строки и bytes хранятся в своём типе, без str().
+# WITHOUT ROWID: строки лежат прямо в b-дереве первичного ключа — один спуск на поиск по key
+_STATE_TABLE_DDL = """
+    CREATE TABLE {name} (
+        key TEXT PRIMARY KEY,
+        value BLOB
+    ) WITHOUT ROWID
+"""
+
+# Материализованный путь заметки: id предков от корня через "/", например "1/5/42".
+# Корень ветки — первый элемент пути; заголовок и parent_id корня берутся одним запросом
+_SQL_GET_ROOT = """
+    SELECT r.title, r.parent_id
+    FROM notes n
+    JOIN notes r ON r.id = CAST(
+        CASE WHEN instr(n.path, '/') > 0 THEN substr(n.path, 1, instr(n.path, '/') - 1) ELSE n.path END
+        AS INTEGER
+    )
+    WHERE n.id=?
+"""
+
+# Заполнение path для старых баз: обход дерева от корней
+_SQL_BACKFILL_PATHS = """
+    WITH RECURSIVE t(id, path) AS (
+        SELECT id, CAST(id AS TEXT) FROM notes WHERE parent_id IS NULL
+        UNION ALL
+        SELECT n.id, t.path || '/' || n.id FROM notes n JOIN t ON n.parent_id = t.id
+    )
+    UPDATE notes SET path = (SELECT path FROM t WHERE t.id = notes.id) WHERE path IS NULL
+"""
+
+
+class _LRUCache:
+    """Небольшой LRU-кеш результатов запросов по id заметки.
+
+    Репозиторием пользуются и фоновые потоки (поиск), поэтому операции под блокировкой:
+    составные get/put иначе могут столкнуться с clear() из UI-потока.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_MISSING = object()
+
+# Вложения крупнее порога хранятся рядом с БД (каталог <db>.blobs) с адресацией по sha256,
+# а в строке attachments остаются только метаданные: БД остаётся компактной, VACUUM — быстрым
+_SIDECAR_THRESHOLD = 1_000_000
+
 
 class NoteRepository:
     """Репозиторий для работы с базой данных заметок"""
 
     def __init__(self, db_path="notes.db"):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        # Для надежной работы ON DELETE CASCADE в SQLite
+        self.db_path = db_path
+        # Каталог для крупных вложений (для БД в памяти всё хранится внутри)
+        if db_path == ":memory:" or str(db_path).startswith("file:"):
+            self._blob_dir = None
+        else:
+            self._blob_dir = os.path.abspath(db_path) + ".blobs"
+        # Своё соединение на каждый поток: в режиме WAL читатели не ждут писателя
+        # и не сериализуются на общем соединении
+        self._local = threading.local()
+        # page_size действует только для новой БД (до первой записи), поэтому задаётся раньше WAL
         try:
-            self.conn.execute("PRAGMA foreign_keys = ON")
+            self.conn.execute("PRAGMA page_size = 4096")
+            # Освобождённые страницы возвращаются порциями через incremental_vacuum().
+            # Для новой БД режим действует сразу, существующая переводится в него полным vacuum()
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.conn.execute("PRAGMA journal_mode = WAL")
         except Exception:
             pass
+        # Схема создаётся один раз, на соединении потока, создавшего репозиторий
         self._init_db()
+        # Таблица state — небольшой словарь настроек; репозиторий единственный, кто в неё пишет,
+        # поэтому читаем её один раз и дальше обслуживаем get_state из памяти (write-through)
+        self._state_cache = dict(self.conn.execute("SELECT key, value FROM state"))
+        # Кеши результатов для повторного выбора тех же заметок в UI.
+        # Сбрасываются методами записи (save_note, delete_note, move_note)
+        self._note_cache = _LRUCache()
+        self._root_cache = _LRUCache()
+        self._path_cache = _LRUCache()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Соединение с БД текущего потока (создаётся при первом обращении)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть соединение и применить настройки, действующие на уровне соединения"""
+        conn = sqlite3.connect(self.db_path, cached_statements=256)
+        # Для надежной работы ON DELETE CASCADE в SQLite
+        try:
+            conn.execute("PRAGMA foreign_keys = ON")
+        except Exception:
+            pass
+        # WAL (задаётся в __init__ и сохраняется в файле БД): запись — дозапись в журнал
+        # без fsync на каждый commit, поэтому достаточно synchronous=NORMAL
+        try:
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA cache_size = -65536")  # 64 МБ
+            conn.execute("PRAGMA temp_store = MEMORY")
+            conn.execute("PRAGMA mmap_size = 268435456")  # 256 МБ
+        except Exception:
+            pass
+        return conn
 
     @staticmethod
     def _normalize_title(title: str) -> str:
@@ -41,6 +184,15 @@ class NoteRepository:
         except sqlite3.OperationalError:
             pass  # Колонка уже существует
 
+        # Миграция: материализованный путь (id предков через "/"), поддерживается create_note/move_note
+        try:
+            cursor.execute("ALTER TABLE notes ADD COLUMN path TEXT")
+        except sqlite3.OperationalError:
+            pass  # Колонка уже существует
+        cursor.execute("SELECT 1 FROM notes WHERE path IS NULL LIMIT 1")
+        if cursor.fetchone():
+            cursor.execute(_SQL_BACKFILL_PATHS)
+
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS attachments (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -52,6 +204,13 @@ class NoteRepository:
                 FOREIGN KEY(note_id) REFERENCES notes(id) ON DELETE CASCADE
             )
         """)
+        # Миграция: крупные вложения во внешних файлах (bytes=NULL, file_path относительно <db>.blobs)
+        for column in ("file_path TEXT", "size INTEGER"):
+            try:
+                cursor.execute(f"ALTER TABLE attachments ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass  # Колонка уже существует
+
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS note_links (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -62,14 +221,49 @@ class NoteRepository:
             )
         """)
         # Таблица состояния приложения
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS state (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            )
-        """)
+        self._ensure_state_table(cursor)
+
+        # Индексы под частые выборки: вложения заметки, поиск по (parent_id, title), связи
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_attachments_note_kind ON attachments(note_id, kind)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_parent_title ON notes(parent_id, title)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_parent ON notes(parent_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_links_from ON note_links(from_note_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_path ON notes(path)")
+
+        # История и глобальный поиск сортируют по времени изменения
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_notes_updated_at'")
+        updated_at_index_is_new = cursor.fetchone() is None
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_updated_at ON notes(updated_at DESC)")
+
+        # Статистика для планировщика собирается один раз (при первой инициализации)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'")
+        if not cursor.fetchone():
+            cursor.execute("ANALYZE")
+        elif updated_at_index_is_new:
+            # Старая база уже с собранной статистикой: досчитываем только новый индекс
+            cursor.execute("ANALYZE idx_notes_updated_at")
+
         self.conn.commit()
 
+    def _ensure_state_table(self, cursor):
+        """Создать таблицу state или перестроить старую (value TEXT, с rowid) под текущую схему"""
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='state'")
+        row = cursor.fetchone()
+        if not row:
+            cursor.execute(_STATE_TABLE_DDL.format(name="state"))
+            return
+
+        cursor.execute("PRAGMA table_info(state)")
+        value_type = next((col[2] for col in cursor.fetchall() if col[1] == "value"), "")
+        if value_type.upper() == "BLOB" and "WITHOUT ROWID" in row[0].upper():
+            return
+
+        cursor.execute("DROP TABLE IF EXISTS state_new")
+        cursor.execute(_STATE_TABLE_DDL.format(name="state_new"))
+        cursor.execute("INSERT INTO state_new(key, value) SELECT key, value FROM state")
+        cursor.execute("DROP TABLE state")
+        cursor.execute("ALTER TABLE state_new RENAME TO state")
+
     def get_all_notes(self):
         """Получить все заметки (id, parent_id, title, body_html, cursor_position, updated_at)"""
         cursor = self.conn.cursor()
@@ -86,43 +280,77 @@ class NoteRepository:
         )
         return cursor.fetchall()
 
+    def get_all_notes_meta(self):
+        """Получить все заметки без содержимого (id, parent_id, title, updated_at) — для построения дерева"""
+        return list(self.iter_all_notes_meta())
+
+    def iter_all_notes_meta(self):
+        """То же, что get_all_notes_meta(), но строки отдаются по мере чтения, без промежуточного списка"""
+        yield from self.conn.execute(
+            """
+            SELECT id, parent_id, title, updated_at
+            FROM notes
+            ORDER BY
+                (parent_id IS NULL) DESC,
+                CASE WHEN parent_id IS NULL THEN title END ASC,
+                parent_id,
+                id DESC
+            """
+        )
+
     def get_note(self, note_id: int):
         """Получить одну заметку (id, parent_id, title, body_html, cursor_position, updated_at)"""
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT id, parent_id, title, body_html, cursor_position, updated_at FROM notes WHERE id=?",
-            (note_id,),
-        )
-        return cursor.fetchone()
+        row = self._note_cache.get(note_id)
+        if row is None:
+            row = self.conn.execute(_SQL_GET_NOTE, (note_id,)).fetchone()
+            if row is not None:
+                self._note_cache.put(note_id, row)
+        return row
+
+    def _invalidate(self, note_id, subtree_path=None):
+        """Сбросить кешированные данные заметки; при subtree_path — и пути/корни всего её поддерева"""
+        self._note_cache.pop(note_id)
+        self._root_cache.pop(note_id)
+        self._path_cache.pop(note_id)
+        if subtree_path:
+            rows = self.conn.execute(
+                "SELECT id FROM notes WHERE path >= ? AND path < ?",
+                (subtree_path + "/", subtree_path + "0"),
+            )
+            for (descendant_id,) in rows:
+                self._root_cache.pop(descendant_id)
+                self._path_cache.pop(descendant_id)
 
     def save_note(self, note_id, title, body_html, cursor_pos=0):
         """Сохранить изменения в заметке"""
-        cursor = self.conn.cursor()
-
         title = self._normalize_title(title)
 
-        # Сначала проверяем, изменилось ли что-нибудь
-        cursor.execute("SELECT title, body_html, cursor_position FROM notes WHERE id=?", (note_id,))
-        row = cursor.fetchone()
-
-        if row:
-            current_title, current_body, current_pos = row
-            # Обработка None значений
-            current_body = current_body or ""
-            current_pos = current_pos or 0
-
-            # Если ничего не изменилось, просто выходим
-            if current_title == title and current_body == body_html and current_pos == cursor_pos:
-                return
-
-        cursor.execute(
-            """
-            UPDATE notes SET title=?, body_html=?, cursor_position=?, updated_at=? WHERE id=?
-        """,
-            (title, body_html, cursor_pos, datetime.now().isoformat(sep=" "), note_id),
+        # Заголовок входит в пути потомков (и в имя ветки, если это корень), поэтому при
+        # переименовании сбрасываются кеши поддерева. Прежний заголовок берём из кеша,
+        # а из БД (вместе с путём) — только если по кешу переименование не исключить
+        renamed = False
+        subtree_path = None
+        cached = self._note_cache.get(note_id)
+        if cached is None or cached[2] != title:
+            row = self.conn.execute(_SQL_GET_TITLE_PATH, (note_id,)).fetchone()
+            if row is not None and row[0] != title:
+                renamed = True
+                subtree_path = row[1]
+
+        # Если ничего не изменилось, UPDATE не затронет строк и commit ничего не запишет на диск
+        # (но закрыть неявно открытую транзакцию всё равно нужно)
+        cursor = self.conn.execute(
+            _SQL_UPDATE_NOTE,
+            (title, body_html, cursor_pos, note_id, title, body_html, cursor_pos),
         )
         self.conn.commit()
 
+        if cursor.rowcount:
+            if renamed:
+                self._invalidate(note_id, subtree_path)
+            else:
+                self._note_cache.pop(note_id)
+
     def create_note(self, parent_id, title):
         """Создать новую заметку"""
         cursor = self.conn.cursor()
@@ -135,25 +363,51 @@ class NoteRepository:
         """,
             (parent_id, title),
         )
+        note_id = cursor.lastrowid
+        cursor.execute(
+            "UPDATE notes SET path = IFNULL((SELECT path || '/' FROM notes WHERE id=?), '') || id WHERE id=?",
+            (parent_id, note_id),
+        )
         self.conn.commit()
-        return cursor.lastrowid
+        return note_id
 
     def delete_note(self, note_id):
         """Удалить заметку"""
         cursor = self.conn.cursor()
         cursor.execute("DELETE FROM notes WHERE id=?", (note_id,))
         self.conn.commit()
+        # Вместе с заметкой каскадно удалено всё поддерево
+        self._note_cache.clear()
+        self._root_cache.clear()
+        self._path_cache.clear()
 
     def move_note(self, note_id, new_parent_id):
         """Переместить заметку к новому родителю"""
         cursor = self.conn.cursor()
+        cursor.execute("SELECT path FROM notes WHERE id=?", (note_id,))
+        row = cursor.fetchone()
+        old_path = row[0] if row and row[0] else str(note_id)
+        cursor.execute("SELECT path FROM notes WHERE id=?", (new_parent_id,))
+        row = cursor.fetchone()
+        new_path = f"{row[0]}/{note_id}" if row and row[0] else str(note_id)
+
         cursor.execute(
             """
-            UPDATE notes SET parent_id=?, updated_at=? WHERE id=?
+            UPDATE notes SET parent_id=?, updated_at=datetime('now', 'localtime') WHERE id=?
         """,
-            (new_parent_id, datetime.now().isoformat(sep=" "), note_id),
+            (new_parent_id, note_id),
+        )
+        # Переносим путь заметки и всего её поддерева: диапазон [old/, old0) — все пути,
+        # начинающиеся с "old/" ('0' следует за '/' в ASCII), выбирается по индексу
+        cursor.execute(
+            """
+            UPDATE notes SET path = ? || substr(path, ?)
+            WHERE id=? OR (path >= ? AND path < ?)
+        """,
+            (new_path, len(old_path) + 1, note_id, old_path + "/", old_path + "0"),
         )
         self.conn.commit()
+        self._invalidate(note_id, new_path)
 
     def get_note_by_title(self, title, parent_id=None):
         """Найти заметку по заголовку и родителю"""
@@ -167,156 +421,271 @@ class NoteRepository:
     def search_notes(self, query: str, limit: int = 200):
         """Глобальный поиск по базе (заголовок + тело).
 
-        Возвращает список строк: (id, title, body_html, updated_at)
+        Возвращает список строк: (id, title, updated_at). Тело заметки не выбирается:
+        его читают по id через get_note только для показываемой заметки.
+        """
+        return self.search_notes_page(query, limit=limit)
+
+    def search_notes_page(self, query: str, after=None, limit: int = 50):
+        """Страница глобального поиска, новые заметки первыми.
+
+        after — (updated_at, id) последней строки предыдущей страницы (None для первой).
+        Следующая страница продолжает с этого ключа по индексу, а не пропускает OFFSET строк,
+        поэтому её стоимость не растёт с номером страницы.
+        Возвращает список строк: (id, title, updated_at)
         """
         q = (query or "").strip()
         if not q:
             return []
 
         like = f"%{q}%"
+        params = [like, like]
+        keyset = ""
+        if after is not None:
+            after_updated_at, after_id = after
+            if after_updated_at is None:
+                # NULL в DESC-порядке идут последними: дальше только такие же, с меньшим id
+                keyset = "AND updated_at IS NULL AND id < ?"
+                params.append(after_id)
+            else:
+                keyset = "AND ((updated_at, id) < (?, ?) OR updated_at IS NULL)"
+                params += [after_updated_at, after_id]
+        params.append(int(limit))
+
         cursor = self.conn.cursor()
         cursor.execute(
-            """
-            SELECT id, title, body_html, updated_at
+            f"""
+            SELECT id, title, updated_at
             FROM notes
-            WHERE (title LIKE ? OR body_html LIKE ?)
-            ORDER BY updated_at DESC
+            WHERE (title LIKE ? OR body_html LIKE ?) {keyset}
+            ORDER BY updated_at DESC, id DESC
             LIMIT ?
             """,
-            (like, like, int(limit)),
+            params,
         )
         return cursor.fetchall()
 
+    def _read_sidecar(self, file_path):
+        """Прочитать вложение, вынесенное во внешний файл (None, если файла нет)"""
+        if not file_path or not self._blob_dir:
+            return None
+        try:
+            with open(os.path.join(self._blob_dir, file_path), "rb") as f:
+                return f.read()
+        except OSError as e:
+            print(f"Error reading attachment file {file_path}: {e}")
+            return None
+
     def get_attachments(self, note_id):
         """Получить вложения заметки (id, name, bytes, mime)"""
+        rows = self.conn.execute(_SQL_GET_ATTACHMENTS, (note_id,)).fetchall()
+        return [
+            (att_id, name, img_bytes if file_path is None else self._read_sidecar(file_path), mime)
+            for att_id, name, img_bytes, mime, file_path in rows
+        ]
+
+    def get_attachments_meta(self, note_id):
+        """Получить метаданные вложений заметки без BLOB (id, note_id, name, mime, length)"""
         cursor = self.conn.cursor()
-        cursor.execute("SELECT id, name, bytes, mime FROM attachments WHERE note_id=? AND kind='image'", (note_id,))
+        cursor.execute(
+            """
+            SELECT id, note_id, name, mime, IFNULL(length(bytes), size)
+            FROM attachments WHERE note_id=? AND kind='image'
+            """,
+            (note_id,),
+        )
         return cursor.fetchall()
 
     def get_attachment(self, attachment_id):
         """Получить вложение по ID"""
+        row = self.conn.execute(_SQL_GET_ATTACHMENT, (attachment_id,)).fetchone()
+        if row is None:
+            return None
+        att_id, note_id, name, img_bytes, mime, file_path = row
+        if file_path is not None:
+            img_bytes = self._read_sidecar(file_path)
+        return att_id, note_id, name, img_bytes, mime
+
+    def get_attachments_by_ids(self, attachment_ids):
+        """Получить вложения по списку ID одним запросом (id, bytes, mime)"""
+        ids = list(dict.fromkeys(attachment_ids))
+        if not ids:
+            return []
         cursor = self.conn.cursor()
-        cursor.execute("SELECT id, note_id, name, bytes, mime FROM attachments WHERE id=?", (attachment_id,))
-        return cursor.fetchone()
+        placeholders = ",".join("?" * len(ids))
+        cursor.execute(f"SELECT id, bytes, mime, file_path FROM attachments WHERE id IN ({placeholders})", ids)
+        return [
+            (att_id, img_bytes if file_path is None else self._read_sidecar(file_path), mime)
+            for att_id, img_bytes, mime, file_path in cursor.fetchall()
+        ]
+
+    def get_attachment_meta(self, attachment_id):
+        """Получить метаданные вложения без BLOB (id, note_id, name, mime, length)"""
+        return self.conn.execute(_SQL_GET_ATTACHMENT_META, (attachment_id,)).fetchone()
+
+    def _write_sidecar(self, image_bytes):
+        """Сохранить крупное вложение во внешний файл; возвращает путь относительно каталога вложений"""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        file_path = f"{digest[:2]}/{digest[2:]}"
+        full_path = os.path.join(self._blob_dir, file_path)
+        # Одинаковое содержимое (например, копия картинки в другую заметку) хранится один раз
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            tmp_path = f"{full_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(image_bytes)
+            os.replace(tmp_path, full_path)
+        return file_path
 
     def add_attachment(self, note_id, name, image_bytes, mime):
         """Добавить вложение к заметке"""
         cursor = self.conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO attachments(note_id, kind, name, bytes, mime) VALUES (?, 'image', ?, ?, ?)
-        """,
-            (note_id, name, image_bytes, mime),
-        )
+        if self._blob_dir and image_bytes and len(image_bytes) > _SIDECAR_THRESHOLD:
+            file_path = self._write_sidecar(image_bytes)
+            cursor.execute(
+                """
+                INSERT INTO attachments(note_id, kind, name, bytes, mime, file_path, size)
+                VALUES (?, 'image', ?, NULL, ?, ?, ?)
+            """,
+                (note_id, name, mime, file_path, len(image_bytes)),
+            )
+        else:
+            cursor.execute(
+                """
+                INSERT INTO attachments(note_id, kind, name, bytes, mime) VALUES (?, 'image', ?, ?, ?)
+            """,
+                (note_id, name, image_bytes, mime),
+            )
         self.conn.commit()
         return cursor.lastrowid
 
+    def set_attachment_bytes(self, attachment_id, image_bytes):
+        """Записать содержимое вложения, созданного без данных (add_attachment с image_bytes=None)"""
+        if self._blob_dir and image_bytes and len(image_bytes) > _SIDECAR_THRESHOLD:
+            file_path = self._write_sidecar(image_bytes)
+            self.conn.execute(
+                "UPDATE attachments SET bytes=NULL, file_path=?, size=? WHERE id=?",
+                (file_path, len(image_bytes), attachment_id),
+            )
+        else:
+            self.conn.execute(
+                "UPDATE attachments SET bytes=?, file_path=NULL, size=NULL WHERE id=?",
+                (image_bytes, attachment_id),
+            )
+        self.conn.commit()
+
+    def _remove_orphan_sidecars(self):
+        """Удалить внешние файлы вложений, на которые больше не ссылается ни одна строка"""
+        if not self._blob_dir or not os.path.isdir(self._blob_dir):
+            return
+        referenced = {
+            file_path
+            for (file_path,) in self.conn.execute("SELECT file_path FROM attachments WHERE file_path IS NOT NULL")
+        }
+        for prefix in os.listdir(self._blob_dir):
+            prefix_dir = os.path.join(self._blob_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if f"{prefix}/{name}" not in referenced:
+                    try:
+                        os.remove(os.path.join(prefix_dir, name))
+                    except OSError as e:
+                        print(f"Error removing attachment file {prefix}/{name}: {e}")
+
     def set_state(self, key, value):
-        """Сохранить значение состояния"""
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT OR REPLACE INTO state(key, value) VALUES (?, ?)", (key, str(value)))
+        """Сохранить значение состояния (int, float, str, bytes или None хранятся как есть)"""
+        if not isinstance(value, (int, float, str, bytes, type(None))):
+            value = str(value)
+        self.conn.execute(_SQL_SET_STATE, (key, value))
         self.conn.commit()
+        self._state_cache[key] = value
 
     def get_state(self, key, default=None):
         """Получить значение состояния"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT value FROM state WHERE key=?", (key,))
-        row = cursor.fetchone()
-        return row[0] if row else default
+        return self._state_cache.get(key, default)
 
     def vacuum(self):
         """Сжатие базы данных (освобождение места на диске)"""
-        self.conn.execute("VACUUM")
+        # Полная перестройка заодно переводит старую БД в auto_vacuum=INCREMENTAL
+        self.conn.executescript("PRAGMA auto_vacuum = INCREMENTAL; VACUUM;")
+        self._remove_orphan_sidecars()
+
+    def incremental_vacuum(self, pages=1000):
+        """Вернуть до pages свободных страниц файлу БД без полной перестройки (auto_vacuum=INCREMENTAL).
+
+        База, созданная без инкрементального режима, один раз сжимается полным vacuum(),
+        который переводит её в этот режим.
+        """
+        # 2 — INCREMENTAL; в режиме NONE прагма incremental_vacuum ничего не освобождает
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            self.vacuum()
+            return
+        # executescript выполняет прагму до конца; через execute() sqlite3 делает один шаг,
+        # а каждый шаг incremental_vacuum освобождает только одну страницу
+        self.conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        self._remove_orphan_sidecars()
 
     def get_last_descendant(self, root_id):
         """
         Найти последнюю (по ID) заметку, которая находится в поддереве указанного корня.
         Предполагается структура Root -> Date -> Time (3 уровня), но ищем просто max(id) среди потомков 2-го уровня.
         """
-        cursor = self.conn.cursor()
-        # Ищем среди внуков (детей детей корня)
+        # Последний внук (ребёнок ребёнка корня), а если внуков нет — последний ребёнок.
+        # Обе ветки — индексные выборки по parent_id, объединённые в один запрос
         query = """
-            SELECT n.id, n.parent_id, n.title, n.body_html 
-            FROM notes n 
-            JOIN notes p ON n.parent_id = p.id 
-            WHERE p.parent_id = ? 
-            ORDER BY n.id DESC 
+            SELECT id, parent_id, title, body_html FROM (
+                SELECT * FROM (
+                    SELECT id, parent_id, title, body_html, 0 AS level
+                    FROM notes
+                    WHERE parent_id IN (SELECT id FROM notes WHERE parent_id = ?)
+                    ORDER BY id DESC
+                    LIMIT 1
+                )
+                UNION ALL
+                SELECT * FROM (
+                    SELECT id, parent_id, title, body_html, 1 AS level
+                    FROM notes
+                    WHERE parent_id = ?
+                    ORDER BY id DESC
+                    LIMIT 1
+                )
+            )
+            ORDER BY level
             LIMIT 1
         """
-        cursor.execute(query, (root_id,))
-        row = cursor.fetchone()
-
-        # Если внуков нет, ищем среди детей
-        if not row:
-            cursor.execute(
-                "SELECT id, parent_id, title, body_html FROM notes WHERE parent_id=? ORDER BY id DESC LIMIT 1",
-                (root_id,),
-            )
-            row = cursor.fetchone()
-
-        return row
+        return self.conn.execute(query, (root_id, root_id)).fetchone()
 
     def is_clipboard_note(self, note_id):
         """
         Проверить, принадлежит ли заметка ветке 'Буфер обмена'.
-        Идет вверх по родителям до корня, проверяя title.
+        Корень ветки определяется по материализованному пути заметки.
         """
         if not note_id:
             return False
 
-        cursor = self.conn.cursor()
-        current_id = note_id
-
-        # Максимум 10 уровней вглубь для защиты от циклов
-        for _ in range(10):
-            cursor.execute("SELECT id, parent_id, title FROM notes WHERE id=?", (current_id,))
-            row = cursor.fetchone()
-
-            if not row:
-                return False
-
-            nid, parent_id, title = row
-
-            # Если нашли корневой узел "Буфер обмена"
-            if title == "Буфер обмена" and parent_id is None:
-                return True
-
-            # Если дошли до корня дерева, но это не "Буфер обмена"
-            if parent_id is None:
-                return False
-
-            current_id = parent_id
-
-        return False
+        row = self._get_root(note_id)
+        return bool(row) and row[0] == "Буфер обмена" and row[1] is None
 
     def get_root_branch_name(self, note_id):
         """
         Получить название корневой ветки для заметки.
-        Идет вверх по родителям до корня и возвращает его название.
+        Корень ветки определяется по материализованному пути заметки.
         """
         if not note_id:
             return None
 
-        cursor = self.conn.cursor()
-        current_id = note_id
-
-        # Максимум 10 уровней вглубь для защиты от циклов
-        for _ in range(10):
-            cursor.execute("SELECT id, parent_id, title FROM notes WHERE id=?", (current_id,))
-            row = cursor.fetchone()
+        row = self._get_root(note_id)
+        return row[0] if row and row[1] is None else None
 
-            if not row:
-                return None
-
-            nid, parent_id, title = row
-
-            # Если дошли до корня дерева, возвращаем его название
-            if parent_id is None:
-                return title
-
-            current_id = parent_id
-
-        return None
+    def _get_root(self, note_id):
+        """(title, parent_id) корня ветки заметки или None (с кешированием)"""
+        row = self._root_cache.get(note_id, _MISSING)
+        if row is _MISSING:
+            row = self.conn.execute(_SQL_GET_ROOT, (note_id,)).fetchone()
+            if row is not None:
+                self._root_cache.put(note_id, row)
+        return row
 
     def get_note_path(self, note_id):
         """
@@ -325,38 +694,63 @@ class NoteRepository:
         """
         if not note_id:
             return None
+        return self.get_note_paths([note_id]).get(note_id)
 
-        cursor = self.conn.cursor()
-        path_parts = []
-        current_id = note_id
-
-        # Максимум 20 уровней вглубь для защиты от циклов
-        for _ in range(20):
-            cursor.execute("SELECT id, parent_id, title FROM notes WHERE id=?", (current_id,))
-            row = cursor.fetchone()
-
-            if not row:
-                break
-
-            nid, parent_id, title = row
-            path_parts.append(title)
-
-            # Если дошли до корня дерева
-            if parent_id is None:
-                break
-
-            current_id = parent_id
-
-        # Разворачиваем список (так как шли от заметки к корню)
-        path_parts.reverse()
-        return " / ".join(path_parts) if path_parts else None
+    def get_note_paths(self, note_ids):
+        """
+        Получить пути сразу для нескольких заметок: {note_id: "Корень / ... / Заметка"}.
+        Промахи кеша добираются двумя запросами на весь список (пути и заголовки предков).
+        Заметки, которых нет в базе, в результат не попадают.
+        """
+        paths = {}
+        missing = []
+        for note_id in dict.fromkeys(note_ids):
+            if not note_id:
+                continue
+            path = self._path_cache.get(note_id)
+            if path is not None:
+                paths[note_id] = path
+            else:
+                missing.append(note_id)
+        if not missing:
+            return paths
+
+        placeholders = ",".join("?" * len(missing))
+        id_paths = {
+            note_id: [int(x) for x in path.split("/")]
+            for note_id, path in self.conn.execute(
+                f"SELECT id, path FROM notes WHERE id IN ({placeholders})", missing
+            )
+            if path
+        }
+        if not id_paths:
+            return paths
+
+        ancestor_ids = list({i for ids in id_paths.values() for i in ids})
+        placeholders = ",".join("?" * len(ancestor_ids))
+        titles = dict(self.conn.execute(f"SELECT id, title FROM notes WHERE id IN ({placeholders})", ancestor_ids))
+
+        for note_id, ids in id_paths.items():
+            path_parts = [titles[i] for i in ids if i in titles]
+            if not path_parts:
+                continue
+            path = " / ".join(path_parts)
+            self._path_cache.put(note_id, path)
+            paths[note_id] = path
+        return paths
 
     def clear_history(self):
         """Очистить историю изменений (установить отсечку времени)"""
-        self.set_state("history_cleared_at", datetime.now().isoformat(sep=" "))
+        # Отсечка в том же формате, что и updated_at (datetime('now', 'localtime'), до секунд),
+        # иначе строковое сравнение скрыло бы правки, сделанные в ту же секунду
+        self.set_state("history_cleared_at", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
     def get_recently_updated_notes(self, limit=50):
         """Получить список недавно измененных заметок (id, title, updated_at)"""
+        return list(self.iter_recently_updated_notes(limit))
+
+    def iter_recently_updated_notes(self, limit=50):
+        """То же, что get_recently_updated_notes(), но строки отдаются по мере чтения"""
         cursor = self.conn.cursor()
 
         # Получаем метку времени очистки истории
@@ -370,11 +764,12 @@ class NoteRepository:
         params = []
 
         if cleared_at:
-            query += " AND updated_at > ?"
-            params.append(cleared_at)
+            # Старые отсечки хранились с микросекундами — сравниваем только до секунд
+            query += " AND updated_at >= ?"
+            params.append(cleared_at[:19])
 
         query += " ORDER BY updated_at DESC LIMIT ?"
         params.append(limit)
 
         cursor.execute(query, tuple(params))
-        return cursor.fetchall()
+        yield from cursor
@@ -1,5 +1,4 @@
 """Менеджер темы приложения"""
-import os
 from pathlib import Path
 from PySide6.QtWidgets import QApplication, QStyleFactory
 from PySide6.QtGui import QPalette, QColor
@@ -8,6 +7,10 @@ from PySide6.QtCore import Qt
 
 class ThemeManager:
     """Управление темой (светлая/темная) для всего приложения"""
+
+    # Последняя применённая тема: повторное применение той же темы пропускается,
+    # чтобы Qt не пересчитывал стили всех виджетов
+    _current_theme = None
     
     @staticmethod
     def get_icon_path(icon_name: str) -> str:
@@ -166,6 +169,11 @@ class ThemeManager:
         app = QApplication.instance()
         if not app:
             return
+
+        theme_name = "dark" if theme_name == "dark" else "light"
+        if ThemeManager._current_theme == theme_name:
+            return
+        ThemeManager._current_theme = theme_name
         
         if theme_name == "dark":
             # ИСПОЛЬЗУЕМ FUSION стиль для корректной работы QSS на Windows
@@ -4,39 +4,63 @@ from PySide6.QtWidgets import QSystemTrayIcon, QMenu, QStyle
 
 
 class TrayController:
-    """Контроллер системного трея"""
-    
+    """Контроллер системного трея (один на приложение)"""
+
+    # Иконка трея и её меню создаются один раз; повторное создание контроллера
+    # (например, для нового окна) только перепривязывает их к окну
+    _instance = None
+
+    def __new__(cls, window):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance.tray = None
+        return cls._instance
+
     def __init__(self, window):
+        if self.tray is not None:
+            self.rebind(window)
+            return
+
         self.window = window
         icon = window.style().standardIcon(QStyle.SP_ComputerIcon)
         self.tray = QSystemTrayIcon(icon)
-        
-        menu = QMenu()
-        act_toggle = QAction("Show/Hide")
-        act_toggle.triggered.connect(self.toggle)
-        act_quit = QAction("Quit")
-        act_quit.triggered.connect(self.window.quit_app)
-        menu.addAction(act_toggle)
-        menu.addAction(act_quit)
-        self.tray.setContextMenu(menu)
-        
+
+        # Меню и действия храним в атрибутах, чтобы их не собрал сборщик мусора
+        self.menu = QMenu()
+        self.act_toggle = QAction("Show/Hide", self.menu)
+        self.act_toggle.triggered.connect(self.toggle)
+        self.act_quit = QAction("Quit", self.menu)
+        self.act_quit.triggered.connect(self._quit)
+        self.menu.addAction(self.act_toggle)
+        self.menu.addAction(self.act_quit)
+        self.tray.setContextMenu(self.menu)
+
         # Подключаем обработчик активации трея
         # Используем lambda только для клика по иконке
         self.tray.activated.connect(self._on_tray_activated)
-        
+
         # Показываем иконку трея только один раз при создании
         if not self.tray.isVisible():
             self.tray.show()
 
+    def rebind(self, window):
+        """Привязать существующие иконку и меню трея к другому окну"""
+        # Слоты действий обращаются к self.window при срабатывании, переподключать их не нужно
+        self.window = window
+
     def _on_tray_activated(self, reason):
         """Обработчик активации трея"""
         # Реагируем только на клик левой кнопкой мыши
         if reason == QSystemTrayIcon.Trigger:
             self.toggle()
 
+    def _quit(self):
+        """Выход из приложения через текущее окно"""
+        self.window.quit_app()
+
     def toggle(self):
         """Переключение видимости окна"""
         if self.window.isVisible():
             self.window.hide_to_tray()
         else:
-            self.window.show_and_focus()
\ No newline at end of file
+            self.window.show_and_focus()
@@ -1,27 +1,264 @@
+import hashlib
 import html
 import re
 import traceback
 import unicodedata
-
-from PySide6.QtCore import Qt, QTimer
+from array import array
+from collections import OrderedDict
+
+from PySide6.QtCore import (
+    Qt,
+    QTimer,
+    QEvent,
+    QAbstractListModel,
+    QModelIndex,
+    QObject,
+    QRunnable,
+    QThreadPool,
+    Signal,
+)
 from PySide6.QtGui import QTextDocument, QPalette, QColor
 from PySide6.QtWidgets import (
     QDialog,
     QHBoxLayout,
     QLabel,
     QLineEdit,
-    QListWidget,
-    QListWidgetItem,
+    QListView,
     QVBoxLayout,
     QSplitter,
+    QWidget,
 )
 
 from core.note_editor import NoteEditor
 
 
+# Неразрывные пробелы (NBSP, узкий NBSP, цифровой) ищем как обычные; длина строки не меняется
+_WS_TRANS = str.maketrans({"\u00a0": " ", "\u202f": " ", "\u2007": " "})
+
+
+def _normalize(text: str) -> str:
+    """Неразрывные пробелы -> пробел и NFC; ASCII и уже нормализованный текст не копируются."""
+    if text.isascii():
+        return text
+    text = text.translate(_WS_TRANS)
+    if unicodedata.is_normalized("NFC", text):
+        return text
+    return unicodedata.normalize("NFC", text)
+
+
+# Экранирование текста фрагментов за один проход; переносы строк сразу превращаются в <br>
+# (\r от CRLF выбрасываем, иначе он остаётся в разметке рядом с <br>)
+_SNIPPET_ESCAPE_TABLE = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;", "\n": "<br>", "\r": ""}
+)
+
+# Извлечение текста из HTML регулярками (без QTextDocument)
+_HEAD_RE = re.compile(r"<(head|style|script)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]*>")
+_SPACES_RE = re.compile(r"\s+")
+# Конец блока (с пустым <br /> перед ним, как у пустого абзаца Qt) или <br> -> перенос строки;
+# пробелы после закрывающего тега — это форматирование исходника, а не текст
+_BLOCK_END_RE = re.compile(
+    r"(?:<br\s*/?>\s*)?</(?:p|div|li|h[1-6]|tr|pre|blockquote)\s*>\s*|<br\s*/?>", re.IGNORECASE
+)
+
+
+def _strip_html(body: str) -> str:
+    """Текст из HTML без <head>: абзацы и <br> становятся переносами строк, теги убраны, сущности раскрыты."""
+    text = _TAG_RE.sub("", _BLOCK_END_RE.sub("\n", body))
+    return html.unescape(text).strip("\n")
+
+
+def _may_contain(body_html: str, needle_fold: str) -> bool:
+    """
+    Дешёвый фильтр по сырому HTML без QTextDocument: False означает, что в тексте заметки
+    совпадений точно нет. Теги выбрасываются без пробела (слово, разбитое форматированием,
+    склеивается), сущности раскрываются, пробелы схлопываются с обеих сторон — поэтому
+    лишние "да" возможны, а ложных "нет" нет.
+    """
+    text = html.unescape(_TAG_RE.sub("", _HEAD_RE.sub(" ", body_html)))
+    text = _SPACES_RE.sub(" ", _normalize(text).casefold())
+    return _SPACES_RE.sub(" ", needle_fold) in text
+
+
+# Извлечённый из HTML текст: blake2b(body_html) -> (plain, plain_norm, plain_fold).
+# Ключ по содержимому переживает пересоздание диалога и сам устаревает при правке заметки
+_PLAIN_CACHE_LIMIT = 256
+_plain_cache: OrderedDict[bytes, tuple[str, str, str]] = OrderedDict()
+
+
+def _html_to_plain(body_html: str, needle_fold: str | None = None) -> tuple[str, str, str] | None:
+    """
+    Текст заметки для поиска фрагментов: как есть, нормализованный и со свёрнутым регистром (casefold).
+    Если HTML приходится разбирать через QTextDocument и задан needle_fold, сначала
+    проверяется _may_contain: None — совпадений точно нет, документ не создавался.
+    """
+    key = hashlib.blake2b(body_html.encode("utf-8"), digest_size=8).digest()
+    cached = _plain_cache.get(key)
+    if cached is not None:
+        _plain_cache.move_to_end(key)
+        return cached
+    body = _HEAD_RE.sub("", body_html)
+    if "<style" in body or "<script" in body:
+        # Стили/скрипты внутри body регулярками не разобрать — отдаём QTextDocument,
+        # но сначала дешёвая проверка, что совпадения вообще возможны
+        if needle_fold is not None and not _may_contain(body_html, needle_fold):
+            return None
+        doc = QTextDocument()
+        doc.setHtml(body_html)
+        plain = doc.toPlainText() or ""
+    else:
+        # Для поиска фрагментов рендер не нужен: хватает вырезать теги
+        plain = _strip_html(body)
+
+    # Нормализация для поиска
+    plain_norm = _normalize(plain)
+    value = (plain, plain_norm, plain_norm.casefold())
+
+    _plain_cache[key] = value
+    if len(_plain_cache) > _PLAIN_CACHE_LIMIT:
+        _plain_cache.popitem(last=False)
+    return value
+
+
+class SearchResultsModel(QAbstractListModel):
+    """Результаты поиска: id заметок и их пути в параллельных колонках."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._ids = array("q")
+        self._paths: list[str] = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self._paths[index.row()]
+        if role == Qt.UserRole:
+            return self._ids[index.row()]
+        return None
+
+    def reset(self, ids, paths):
+        """Заменить все строки разом (один сигнал сброса модели вместо вставки по строке)."""
+        self.beginResetModel()
+        self._ids = array("q", ids)
+        self._paths = list(paths)
+        self.endResetModel()
+
+    def append(self, ids, paths):
+        """Дописать строки в конец (следующая страница результатов)."""
+        if not ids:
+            return
+        first = len(self._ids)
+        self.beginInsertRows(QModelIndex(), first, first + len(ids) - 1)
+        self._ids.extend(ids)
+        self._paths.extend(paths)
+        self.endInsertRows()
+
+    def clear(self):
+        self.reset((), ())
+
+    def note_id(self, row: int) -> int:
+        return self._ids[row]
+
+
+class _SnippetSignals(QObject):
+    # (номер запроса превью, HTML, успешно ли построено)
+    finished = Signal(int, str, bool)
+
+
+class _SnippetTask(QRunnable):
+    """Построение HTML превью вне UI-потока; результат приходит сигналом в UI-поток."""
+
+    def __init__(self, request_id: int, build, fallback_html: str):
+        super().__init__()
+        self.signals = _SnippetSignals()
+        self._request_id = request_id
+        self._build = build
+        self._fallback_html = fallback_html
+
+    def run(self):
+        try:
+            self.signals.finished.emit(self._request_id, self._build(), True)
+        except Exception as e:
+            err_msg = (
+                "<div style='color:red; font-weight:bold;'>Error generating snippets:<br>"
+                f"{e}<br><pre>{traceback.format_exc()}</pre></div><hr>"
+            )
+            self.signals.finished.emit(self._request_id, err_msg + self._fallback_html, False)
+
+
+class _SearchSignals(QObject):
+    # (номер поиска, первая ли страница, строки, {note_id: путь})
+    finished = Signal(int, bool, object, object)
+
+
+class _SearchTask(QRunnable):
+    """Запрос страницы поиска и путей заметок вне UI-потока (у потока своё соединение с БД)."""
+
+    def __init__(self, search_id: int, repo, query: str, after, limit: int):
+        super().__init__()
+        self.signals = _SearchSignals()
+        self._search_id = search_id
+        self._repo = repo
+        self._query = query
+        self._after = after
+        self._limit = limit
+
+    def run(self):
+        try:
+            rows = self._repo.search_notes_page(self._query, after=self._after, limit=self._limit)
+            path_map = self._repo.get_note_paths([r[0] for r in rows])
+        except Exception:
+            traceback.print_exc()
+            rows, path_map = [], {}
+        self.signals.finished.emit(self._search_id, self._after is None, rows, path_map)
+
+
 class GlobalSearchDialog(QDialog):
     """Диалог глобального поиска по базе (заголовок + тело)."""
 
+    # Не больше стольких фрагментов в превью (остальные только считаются)
+    _MAX_SNIPPETS = 50
+    # Не больше стольких карточек после слияния соседних совпадений: объём HTML для setHtml ограничен
+    _MAX_FRAGMENTS = 20
+    # Сколько готовых HTML превью (note_id, query) держать в памяти
+    _SNIPPET_CACHE_LIMIT = 128
+    # Более короткие запросы показывают заметку целиком, без поиска фрагментов
+    _MIN_SNIPPET_QUERY_LEN = 2
+    # Результаты грузятся страницами по мере прокрутки списка
+    _PAGE_SIZE = 50
+    # Сколько символов контекста показывать вокруг совпадения
+    _CONTEXT_LEN = 60
+
+    # Шаблоны разметки превью; подставляются цвета из _colors() через format_map
+    _HEADER_TPL = (
+        "<div style='color:{muted}; font-size:12px; margin:0 0 5px 0; "
+        "border-bottom:1px solid {border}; padding-bottom:5px;'>"
+        "Найдено совпадений: {n}"
+        "</div>"
+    )
+    _NO_MATCH_TPL = (
+        "<div style='color:{muted}; font-size:12px; margin:0 0 10px 0; "
+        "border-bottom:1px solid {border}; padding-bottom:5px;'>"
+        "Найдено совпадений: 0 (показан полный текст)"
+        "</div>"
+    )
+    # padding: 5px 10px; - уменьшаем вертикальный padding внутри блока
+    _CARD_OPEN_TPL = (
+        "<div style='padding: 5px 10px; background: {card_bg}; font-family: JetBrains Mono;'>"
+        "<div style='font-size: 15px; line-height: 1.2;'>"
+    )
+    _CARD_CLOSE = "</div></div>"
+    # Разделитель между фрагментами (вместо "Фрагмент #"); margin: 0; padding: 0; - без отступов вокруг черты
+    _DIV_TPL = "<hr style='border: 0; border-top: 1px solid {border}; margin: 0; padding: 0;'>"
+    _MATCH_OPEN_TPL = "<span style='{highlight_style}'>"
+    _MATCH_CLOSE = "</span>"
+    _MORE_TPL = "<div style='color:{muted}; font-size:12px; margin:5px 0 0 0;'>…и ещё {n}</div>"
+
     def __init__(self, repo, parent=None, on_open_note=None):
         super().__init__(parent)
         self.repo = repo
@@ -33,6 +270,55 @@ class GlobalSearchDialog(QDialog):
         self._debounce_timer.setSingleShot(True)
         self._debounce_timer.timeout.connect(self._run_search)
 
+        # Превью тоже откладываем: при удержании стрелки рисуем только последнюю выбранную строку
+        self._preview_timer = QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.timeout.connect(self._do_preview)
+        self._pending_note_id: int | None = None
+
+        # Последний запланированный запрос и номер поиска: результаты, пришедшие
+        # после более нового запроса, отбрасываются
+        self._last_query = ""
+        self._search_gen = 0
+        # Постраничная выдача: запрос, ключ последней строки (updated_at, id) и есть ли ещё
+        self._page_query = ""
+        self._last_cursor = None
+        self._has_more = False
+        # Запрос к БД идёт в отдельном потоке: ввод и Esc не ждут SQLite
+        self._search_pool = QThreadPool(self)
+        self._search_pool.setMaxThreadCount(1)
+        self._search_tasks: dict[int, _SearchTask] = {}
+        self._page_loading = False
+
+        # (query, query_norm, query_fold) последнего запроса: при переходах по результатам
+        # запрос обычно не меняется, и нормализация не повторяется
+        self._query_cache: tuple[str, str, str] | None = None
+        # query_norm -> скомпилированная регулярка для запасного пути поиска (см. _get_rx)
+        self._rx_cache: dict[str, re.Pattern] = {}
+
+        # (note_id, query), показанные в превью сейчас
+        self._shown_key = None
+        # Цвета палитры в виде HTML-строк; сбрасываются при смене палитры (см. _colors)
+        self._theme_colors: dict | None = None
+        # (note_id, query) -> готовый HTML превью; содержимое заметок за время жизни модального
+        # диалога не меняется, а цвета в HTML сбрасываются вместе с палитрой (см. changeEvent)
+        self._snippet_cache: OrderedDict[tuple[int, str], str] = OrderedDict()
+        self._snippet_hits = 0
+        self._snippet_misses = 0
+
+        # Фрагменты строятся в отдельном потоке, чтобы список и строка поиска не подвисали
+        # на больших заметках. Один поток: кеши текста и запроса не делятся между задачами
+        self._snippet_pool = QThreadPool(self)
+        self._snippet_pool.setMaxThreadCount(1)
+        # Номер последнего запрошенного превью и его ключ кеша; устаревшие результаты отбрасываются
+        self._preview_gen = 0
+        self._preview_key = None
+        # Запущенные задачи по номеру запроса: держим ссылки, пока не придёт результат
+        self._snippet_tasks: dict[int, _SnippetTask] = {}
+        # Уже применённые цвета меток и CSS превью: Qt перечитывает стиль на каждое присваивание
+        self._last_label_sig = None
+        self._last_css_sig = None
+
         self._build_ui()
 
     def showEvent(self, event):
@@ -62,23 +348,31 @@ class GlobalSearchDialog(QDialog):
         # Разделитель с результатами и превью
         splitter = QSplitter(Qt.Horizontal)
         root.addWidget(splitter, 1)
+        self._splitter = splitter
 
         # Результаты (левая часть)
-        self.list = QListWidget()
-        self.list.itemActivated.connect(self._open_selected)
-        self.list.currentItemChanged.connect(self._on_current_changed)
+        self._results = SearchResultsModel(self)
+        self.list = QListView()
+        self.list.setModel(self._results)
+        self.list.activated.connect(self._open_selected)
+        self.list.selectionModel().currentChanged.connect(self._on_current_changed)
         # В некоторых стилях/темах длинные строки могут переноситься "по буквам".
         # Явно отключаем переносы и включаем элипсис.
         self.list.setWordWrap(False)
         self.list.setTextElideMode(Qt.ElideRight)
+        # Строки однострочные и одной высоты: вид не измеряет каждую строку при пересчёте раскладки
+        self.list.setUniformItemSizes(True)
         self.list.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        sb = self.list.verticalScrollBar()
+        sb.valueChanged.connect(self._on_list_scrolled)
+        # Увеличение окна может убрать полосу прокрутки — тогда догружаем без прокрутки
+        sb.rangeChanged.connect(self._on_list_scrolled)
         splitter.addWidget(self.list)
 
-        # Превью (правая часть) - используем NoteEditor для поддержки картинок
-        self.preview = NoteEditor()
-        self.preview.setReadOnly(True)
-        self.preview.set_context(self.repo)
-        splitter.addWidget(self.preview)
+        # Превью (правая часть). NoteEditor тяжёлый, поэтому до первого выбранного
+        # результата на его месте стоит пустой виджет (см. _ensure_preview)
+        self.preview = None
+        splitter.addWidget(QWidget())
 
         splitter.setSizes([400, 800])
 
@@ -89,21 +383,58 @@ class GlobalSearchDialog(QDialog):
 
         self._apply_theme()
 
+    def changeEvent(self, event):
+        if event.type() == QEvent.PaletteChange:
+            self._theme_colors = None
+            self._snippet_cache.clear()
+        super().changeEvent(event)
+
+    def _colors(self) -> dict:
+        """Цвета текущей палитры для стилей и HTML превью (считаются один раз на палитру)."""
+        if self._theme_colors is None:
+            pal = self.palette()
+            # "Приглушённый" цвет текста (для подсказок/статуса)
+            placeholder_role = getattr(QPalette.ColorRole, "PlaceholderText", QPalette.ColorRole.Text)
+            is_dark = pal.color(QPalette.ColorRole.Window).lightness() < 128
+            match_bg = "#ffd54f" if is_dark else "#ffeb3b"
+            self._theme_colors = {
+                "text": pal.color(QPalette.ColorRole.Text).name(QColor.HexRgb),
+                "base": pal.color(QPalette.ColorRole.Base).name(QColor.HexRgb),
+                "link": pal.color(QPalette.ColorRole.Link).name(QColor.HexRgb),
+                "muted": pal.color(placeholder_role).name(QColor.HexRgb),
+                "border": pal.color(QPalette.ColorRole.Mid).name(QColor.HexRgb),
+                "card_bg": pal.color(QPalette.ColorRole.AlternateBase).name(QColor.HexRgb),
+                "is_dark": is_dark,
+                "highlight_style": f"background-color: {match_bg}; color: #000000; font-weight: bold;",
+            }
+        return self._theme_colors
+
     def _apply_theme(self):
         """Привязка цветов/HTML к текущей палитре (поддержка тёмной темы)."""
-        pal = self.palette()
+        muted = self._colors()["muted"]
+
+        if muted != self._last_label_sig:
+            self._last_label_sig = muted
+            self.stats_lbl.setStyleSheet(f"color: {muted}; margin-left: 10px;")
+            self.hint_lbl.setStyleSheet(f"color: {muted};")
 
-        # "Приглушённый" цвет текста (для подсказок/статуса)
-        placeholder_role = getattr(QPalette.ColorRole, "PlaceholderText", QPalette.ColorRole.Text)
-        muted = pal.color(placeholder_role)
+        if self.preview is not None:
+            self._apply_preview_theme()
 
-        self.stats_lbl.setStyleSheet(f"color: {muted.name(QColor.HexRgb)}; margin-left: 10px;")
-        self.hint_lbl.setStyleSheet(f"color: {muted.name(QColor.HexRgb)};")
+    def _apply_preview_theme(self):
+        """CSS по умолчанию для HTML превью в цветах текущей палитры."""
+        colors = self._colors()
 
         # Базовые цвета для HTML предпросмотра
-        text = pal.color(QPalette.ColorRole.Text).name(QColor.HexRgb)
-        base = pal.color(QPalette.ColorRole.Base).name(QColor.HexRgb)
-        link = pal.color(QPalette.ColorRole.Link).name(QColor.HexRgb)
+        text = colors["text"]
+        base = colors["base"]
+        link = colors["link"]
+
+        # Та же палитра — CSS не переставляем, иначе документ сбросит кеш разметки
+        sig = (text, base, link)
+        if sig == self._last_css_sig:
+            return
+        self._last_css_sig = sig
 
         # Важно: setDefaultStyleSheet задаёт CSS по умолчанию для HTML в QTextDocument.
         # Если его не задать, QTextEdit в тёмной теме может остаться с чёрным текстом по умолчанию.
@@ -119,181 +450,325 @@ class GlobalSearchDialog(QDialog):
             )
         )
 
+    def _ensure_preview(self) -> NoteEditor:
+        """Создаёт NoteEditor превью при первом обращении (используем его для поддержки картинок)."""
+        if self.preview is None:
+            preview = NoteEditor()
+            preview.setReadOnly(True)
+            preview.set_context(self.repo)
+            sizes = self._splitter.sizes()
+            self._splitter.replaceWidget(1, preview).deleteLater()
+            self._splitter.setSizes(sizes)
+            self.preview = preview
+            self._last_css_sig = None
+            self._apply_preview_theme()
+        return self.preview
+
     def _schedule_search(self):
-        self._debounce_timer.start(150)
+        q = (self.edit.text() or "").strip()
+        # Дописывание к прежнему запросу — быстрый ответ, новый запрос — ждём дольше
+        extends = bool(self._last_query) and q.startswith(self._last_query)
+        self._last_query = q
+        # Результаты поиска, начатого до этой правки запроса, уже не нужны
+        self._search_gen += 1
+        self._debounce_timer.start(50 if extends else 250)
 
     def _run_search(self):
         q = (self.edit.text() or "").strip()
-        self.list.clear()
-        self.preview.clear()
+        # Отложенное превью относится к прежним результатам
+        self._preview_timer.stop()
+        self._pending_note_id = None
+        self._preview_gen += 1
+        # До очистки: сброс прокрутки не должен подгружать страницы прежнего запроса
+        self._has_more = False
+        self._page_loading = False
+        self._results.clear()
+        self._rx_cache.clear()
+        if self.preview is not None:
+            self.preview.clear()
+        self._shown_key = None
         self.stats_lbl.clear()
 
         if not q:
             return
 
-        rows = self.repo.search_notes(q, limit=200)
-        self.stats_lbl.setText(f"Найдено: {len(rows)}")
-
-        for note_id, title, body_html, updated_at in rows:
-            path = self.repo.get_note_path(note_id) or title
-            text = path
-
-            item = QListWidgetItem(text)
-            item.setData(Qt.UserRole, note_id)
-            item.setData(Qt.UserRole + 1, body_html)
-            self.list.addItem(item)
-
-    def _open_selected(self, item: QListWidgetItem):
-        note_id = item.data(Qt.UserRole)
+        self._search_gen += 1
+        self._page_query = q
+        self._last_cursor = None
+        self._start_search_task(None)
+
+    def _fetch_next_page(self):
+        if not self._page_loading:
+            self._start_search_task(self._last_cursor)
+
+    def _start_search_task(self, after):
+        self._page_loading = True
+        task = _SearchTask(self._search_gen, self.repo, self._page_query, after, self._PAGE_SIZE)
+        task.signals.finished.connect(self._on_search_finished)
+        self._search_tasks[id(task)] = task
+        task.signals.finished.connect(lambda *_, key=id(task): self._search_tasks.pop(key, None))
+        self._search_pool.start(task)
+
+    def _on_search_finished(self, search_id: int, first_page: bool, rows, path_map):
+        if search_id != self._search_gen:
+            # Запрос успели изменить — это результаты устаревшего поиска
+            return
+        self._page_loading = False
+        columns = self._page_columns(rows, path_map)
+        if first_page:
+            self._results.reset(*columns)
+        else:
+            self._results.append(*columns)
+        self._update_stats()
+        if self._has_more:
+            # Страница могла целиком поместиться в список: полосы прокрутки нет и valueChanged
+            # не придёт. Проверяем после отложенной раскладки вида
+            QTimer.singleShot(0, self._on_list_scrolled)
+
+    def _update_stats(self):
+        # "+" — загружены не все найденные, остальные подгрузятся при прокрутке
+        self.stats_lbl.setText(f"Найдено: {self._results.rowCount()}{'+' if self._has_more else ''}")
+
+    def _page_columns(self, rows, path_map):
+        """Колонки (ids, paths) для модели из строк страницы; запоминает ключ следующей страницы."""
+        # Колонки заполняем одним проходом и отдаём модели разом.
+        # Тела заметки в строках нет: превью берёт его из репозитория (там LRU-кеш)
+        ids = []
+        paths = []
+        for note_id, title, updated_at in rows:
+            ids.append(note_id)
+            paths.append(path_map.get(note_id) or title)
+
+        self._has_more = len(rows) == self._PAGE_SIZE
+        if rows:
+            self._last_cursor = (rows[-1][2], rows[-1][0])
+        return ids, paths
+
+    def _on_list_scrolled(self, *_):
+        # Подгружаем следующую страницу, когда до конца списка осталось меньше экрана
+        # (в том числе когда список не заполняет видимую область и прокрутки нет)
+        sb = self.list.verticalScrollBar()
+        if self._has_more and sb.value() >= sb.maximum() - sb.pageStep():
+            self._fetch_next_page()
+
+    def _open_selected(self, index: QModelIndex):
+        if not index.isValid():
+            return
+        note_id = self._results.note_id(index.row())
         if self.on_open_note and note_id:
             self.on_open_note(int(note_id))
         self.accept()
 
-    def _on_current_changed(self, current: QListWidgetItem, previous: QListWidgetItem):
-        if not current:
-            self.preview.clear()
+    def _on_current_changed(self, current: QModelIndex, previous: QModelIndex):
+        if not current.isValid():
+            self._preview_timer.stop()
+            self._pending_note_id = None
+            self._preview_gen += 1
+            if self.preview is not None:
+                self.preview.clear()
+            self._shown_key = None
             return
 
-        note_id = current.data(Qt.UserRole)
-        self.preview.set_current_note_id(note_id)
+        self._pending_note_id = self._results.note_id(current.row())
+        self._preview_timer.start(80)
+
+    def _do_preview(self):
+        note_id = self._pending_note_id
+        self._pending_note_id = None
+        if note_id is None:
+            return
 
         query = self.edit.text().strip()
+
+        # Та же заметка с тем же запросом уже показана — повторно HTML не разбираем
+        shown_key = (note_id, query)
+        if shown_key == self._shown_key:
+            return
+        self._shown_key = shown_key
+        # Всё, что ещё строится для прежней строки, станет устаревшим
+        self._preview_gen += 1
+
+        self._ensure_preview().set_current_note_id(note_id)
+
+        cache_key = (note_id, query)
+        cached = self._snippet_cache.get(cache_key)
+        if cached is not None:
+            self._snippet_hits += 1
+            self._snippet_cache.move_to_end(cache_key)
+            self.preview.setHtml(cached)
+            return
+
         body_html = ""
         try:
             row = self.repo.get_note(int(note_id)) if note_id else None
             if row:
                 body_html = row[3] or ""
-            else:
-                body_html = current.data(Qt.UserRole + 1) or ""
         except Exception:
-            body_html = current.data(Qt.UserRole + 1) or ""
+            pass
 
-        if not query:
+        if len(query) < self._MIN_SNIPPET_QUERY_LEN:
+            # Пустой или однобуквенный запрос: фрагменты были бы на каждом шагу
             self.preview.setHtml(body_html)
             return
 
-        try:
-            snippets_html = self._generate_snippets(body_html, query)
-            self.preview.setHtml(snippets_html)
-        except Exception as e:
-            err_msg = (
-                "<div style='color:red; font-weight:bold;'>Error generating snippets:<br>"
-                f"{e}<br><pre>{traceback.format_exc()}</pre></div><hr>"
-            )
-            self.preview.setHtml(err_msg + body_html)
+        query_norm, query_fold, rx = self._prepare_query(query)
+        if not query_norm:
+            self.preview.setHtml(body_html)
+            return
 
-    def _generate_snippets(self, html_content: str, query: str) -> str:
+        # Цвета палитры и разобранный запрос готовим здесь: кеши диалога и виджеты
+        # трогаем только из UI-потока, в задачу уходят неизменяемые значения
+        colors = self._colors()
+        self._preview_key = cache_key
+        task = _SnippetTask(
+            self._preview_gen,
+            lambda: self._generate_snippets(body_html, query_norm, query_fold, rx, colors),
+            body_html,
+        )
+        task.signals.finished.connect(self._on_snippets_ready)
+        self._snippet_tasks[self._preview_gen] = task
+        self._snippet_pool.start(task)
+
+    def _on_snippets_ready(self, request_id: int, snippets_html: str, ok: bool):
+        self._snippet_tasks.pop(request_id, None)
+        if request_id != self._preview_gen or self.preview is None:
+            # Пока строили, выбрали другую строку или перезапустили поиск
+            return
+        if ok:
+            self._snippet_misses += 1
+            self._snippet_cache[self._preview_key] = snippets_html
+            if len(self._snippet_cache) > self._SNIPPET_CACHE_LIMIT:
+                self._snippet_cache.popitem(last=False)
+        self.preview.setHtml(snippets_html)
+
+    def cache_stats(self) -> dict:
+        """Счётчики кешей превью (для отладки)."""
+        return {
+            "snippet_hits": self._snippet_hits,
+            "snippet_misses": self._snippet_misses,
+            "snippet_size": len(self._snippet_cache),
+            "plain_size": len(_plain_cache),
+        }
+
+    def _get_rx(self, query_norm: str) -> re.Pattern:
+        """Регулярка для литерального поиска без учёта регистра, компилируется один раз на запрос."""
+        rx = self._rx_cache.get(query_norm)
+        if rx is None:
+            rx = self._rx_cache[query_norm] = re.compile(re.escape(query_norm), re.IGNORECASE)
+        return rx
+
+    def _prepare_query(self, query: str) -> tuple[str, str, re.Pattern | None]:
+        """(query_norm, query_fold, регулярка) для построения превью; вызывается в UI-потоке."""
+        if self._query_cache and self._query_cache[0] == query:
+            _, query_norm, query_fold = self._query_cache
+        else:
+            query_norm = _normalize(query or "")
+            query_fold = query_norm.casefold()
+            self._query_cache = (query, query_norm, query_fold)
+        if not query_norm:
+            return query_norm, query_fold, None
+        return query_norm, query_fold, self._get_rx(query_norm)
+
+    def _generate_snippets(
+        self, html_content: str, query_norm: str, query_fold: str, rx: re.Pattern, colors: dict
+    ) -> str:
         """
         ВАРИАНТ A: Работаем с plain text.
         Извлекаем текст, ищем совпадения, вырезаем фрагменты и оборачиваем в HTML сами.
+        Выполняется в потоке _snippet_pool: состояние диалога не трогает, запрос, регулярку
+        и цвета получает готовыми (см. _prepare_query).
         """
-        # 1. Получаем чистый текст из HTML с помощью QTextDocument (он хорошо убирает теги)
-        doc = QTextDocument()
-        doc.setHtml(html_content)
-        plain = doc.toPlainText() or ""
-
-        # Нормализация для поиска
-        plain_norm = unicodedata.normalize("NFC", plain.replace("\u00a0", " "))
-        query_norm = unicodedata.normalize("NFC", (query or "").replace("\u00a0", " "))
-
-        if not query_norm:
-            return html_content
-
-        pattern = re.escape(query_norm)
-        try:
-            rx = re.compile(pattern, re.IGNORECASE)
-        except re.error:
-            # Если запрос некорректен как регулярка (маловероятно после escape), возвращаем оригинал
-            return html_content
-
+        # 1. Чистый текст из HTML (кешируется по содержимому заметки).
+        # Заметки, найденные только по заголовку, отсекаются без разбора HTML
+        extracted = _html_to_plain(html_content, query_fold)
+        if extracted is None:
+            return self._NO_MATCH_TPL.format_map(colors) + html_content
+        plain, plain_norm, plain_fold = extracted
+
+        # Собираем не больше _MAX_SNIPPETS совпадений, остальные только досчитываем
         match_positions = []
-        for m in rx.finditer(plain_norm):
-            match_positions.append((m.start(), m.end()))
-
-        pal = self.preview.palette()
-        placeholder_role = getattr(QPalette.ColorRole, "PlaceholderText", QPalette.ColorRole.Text)
-        muted = pal.color(placeholder_role).name(QColor.HexRgb)
-        border = pal.color(QPalette.ColorRole.Mid).name(QColor.HexRgb)
-        card_bg = pal.color(QPalette.ColorRole.AlternateBase).name(QColor.HexRgb)
-        window_bg = pal.color(QPalette.ColorRole.Window).lightness()
-        is_dark = window_bg < 128
-
-        match_bg = "#ffd54f" if is_dark else "#ffeb3b"
-        match_fg = "#000000"
-        highlight_style = f"background-color: {match_bg}; color: {match_fg}; font-weight: bold;"
+        total_hits = 0
+        if len(plain_fold) == len(plain_norm) and len(query_fold) == len(query_norm):
+            # Запрос — литерал, поэтому хватает str.find по тексту со свёрнутым регистром
+            n = len(query_fold)
+            i = plain_fold.find(query_fold)
+            while i >= 0:
+                if total_hits < self._MAX_SNIPPETS:
+                    match_positions.append((i, i + n))
+                total_hits += 1
+                i = plain_fold.find(query_fold, i + n)
+        else:
+            # casefold() поменял длину (например, "ß" -> "ss"), позиции разъехались бы — ищем регуляркой
+            matches = rx.finditer(plain_norm)
+            for m in matches:
+                match_positions.append((m.start(), m.end()))
+                if len(match_positions) >= self._MAX_SNIPPETS:
+                    break
+            total_hits = len(match_positions) + sum(1 for _ in matches)
 
         # Если ничего не нашли в тексте (может быть в тегах, но мы ищем по контенту)
         if not match_positions:
-            return (
-                f"<div style='color:{muted}; font-size:12px; margin:0 0 10px 0; "
-                f"border-bottom:1px solid {border}; padding-bottom:5px;'>"
-                "Найдено совпадений: 0 (показан полный текст)"
-                "</div>" + html_content
-            )
+            return self._NO_MATCH_TPL.format_map(colors) + html_content
 
         # 2. Формируем HTML список фрагментов
-        CONTEXT_LEN = 60
+        context_len = self._CONTEXT_LEN
         text_len = len(plain)
+        table = _SNIPPET_ESCAPE_TABLE
+
+        # Неизменные части разметки собираем один раз, а не на каждое совпадение
+        card_open = self._CARD_OPEN_TPL.format_map(colors)
+        card_close = self._CARD_CLOSE
+        divider_html = self._DIV_TPL.format_map(colors)
+        match_open = self._MATCH_OPEN_TPL.format_map(colors)
+        match_close = self._MATCH_CLOSE
+
+        parts = [self._HEADER_TPL.format_map(colors | {"n": total_hits})]
+
+        # Окна контекста соседних совпадений сливаем в один фрагмент,
+        # иначе плотные совпадения дают почти одинаковые карточки
+        fragments = []
+        for start, end in match_positions:
+            frag_start = max(0, start - context_len)
+            frag_end = min(text_len, end + context_len)
+            if fragments and frag_start <= fragments[-1][1]:
+                last = fragments[-1]
+                last[1] = max(last[1], frag_end)
+                last[2].append((start, end))
+            else:
+                fragments.append([frag_start, frag_end, [(start, end)]])
 
-        found_fragments = []
-
-        for i, (start, end) in enumerate(match_positions):
-            # Определяем границы фрагмента
-            frag_start = max(0, start - CONTEXT_LEN)
-            frag_end = min(text_len, end + CONTEXT_LEN)
-
-            # Вырезаем части текста
-            prefix = plain[frag_start:start]
-            match_text = plain[start:end]
-            suffix = plain[end:frag_end]
-
-            # Собираем HTML, ОБЯЗАТЕЛЬНО экранируя текст
-            safe_prefix = html.escape(prefix)
-            safe_match = html.escape(match_text)
-            safe_suffix = html.escape(suffix)
-
+        del fragments[self._MAX_FRAGMENTS:]
+        for i, (frag_start, frag_end, spans) in enumerate(fragments):
+            if i > 0:
+                parts.append(divider_html)
+            parts.append(card_open)
             # Добавляем многоточия, если обрезали
             if frag_start > 0:
-                safe_prefix = "..." + safe_prefix
+                parts.append("...")
+            # Вырезанные части текста ОБЯЗАТЕЛЬНО экранируем;
+            # переносы строк заменяем на <br>, чтобы выглядело как текст (всё это делает table)
+            pos = frag_start
+            for start, end in spans:
+                parts.append(plain[pos:start].translate(table))
+                parts.append(match_open)
+                parts.append(plain[start:end].translate(table))
+                parts.append(match_close)
+                pos = end
+            parts.append(plain[pos:frag_end].translate(table))
             if frag_end < text_len:
-                safe_suffix = safe_suffix + "..."
-
-            snippet_html = (
-                f"{safe_prefix}"
-                f"<span style='{highlight_style}'>{safe_match}</span>"
-                f"{safe_suffix}"
-            )
-
-            # Заменяем переносы строк на <br>, чтобы в браузере выглядело как текст
-            snippet_html = snippet_html.replace("\n", "<br>")
-
-            # Разделитель между фрагментами (вместо "Фрагмент #")
-            divider_html = ""
-            if i > 0:
-                # margin: 0; padding: 0; - убираем отступы вокруг черты
-                divider_html = f"<hr style='border: 0; border-top: 1px solid {border}; margin: 0; padding: 0;'>"
-
-            # Оборачиваем в блок (цвета берём из текущей палитры, чтобы работало в тёмной теме)
-            # padding: 5px 10px; - уменьшаем вертикальный padding внутри блока
-            found_fragments.append(
-                divider_html
-                + f"<div style='padding: 5px 10px; background: {card_bg}; font-family: JetBrains Mono;'>"
-                + f"<div style='font-size: 15px; line-height: 1.2;'>{snippet_html}</div>"
-                + "</div>"
-            )
+                parts.append("...")
+            parts.append(card_close)
 
-        header = (
-            f"<div style='color:{muted}; font-size:12px; margin:0 0 5px 0; "
-            f"border-bottom:1px solid {border}; padding-bottom:5px;'>"
-            f"Найдено совпадений: {len(match_positions)}"
-            "</div>"
-        )
+        # Совпадения из отброшенных карточек и несобранные сверх _MAX_SNIPPETS
+        hidden = total_hits - sum(len(spans) for _, _, spans in fragments)
+        if hidden > 0:
+            parts.append(self._MORE_TPL.format_map(colors | {"n": hidden}))
 
-        return header + "".join(found_fragments)
+        return "".join(parts)
 
     def _on_search_enter(self):
         """Перенос фокуса в список при нажатии Enter в строке поиска."""
-        if self.list.count() > 0:
+        if self._results.rowCount() > 0:
             self.list.setFocus()
-            if not self.list.currentItem():
-                self.list.setCurrentRow(0)
+            if not self.list.currentIndex().isValid():
+                self.list.setCurrentIndex(self._results.index(0))
@@ -51,9 +51,7 @@ class HistoryDialog(QDialog):
     def load_history(self):
         self.list_widget.clear()
         # Получаем 50 последних измененных
-        notes = self.repo.get_recently_updated_notes(50)
-        
-        for note in notes:
+        for note in self.repo.iter_recently_updated_notes(50):
             # note: (id, title, updated_at)
             nid, title, updated_at = note
             
@@ -35,11 +35,12 @@ class PreviewLabel(QLabel):
                 ))
 
 class ImageSelectionDialog(QDialog):
-    def __init__(self, images, parent=None):
+    def __init__(self, images, repo, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Select Image to Edit")
         self.resize(800, 500)
-        self.images = images  # list of (id, note_id, name, data, mime)
+        self.images = images  # list of (id, note_id, name, mime, length)
+        self.repo = repo
         self.selected_image = None
         
         layout = QVBoxLayout(self)
@@ -48,7 +49,7 @@ class ImageSelectionDialog(QDialog):
         
         self.list_widget = QListWidget()
         for img_data in self.images:
-            # img_data structure: (id, note_id, name, data, mime)
+            # img_data structure: (id, note_id, name, mime, length)
             name = img_data[2]
             self.list_widget.addItem(name)
         self.list_widget.currentRowChanged.connect(self.on_row_changed)
@@ -73,9 +74,9 @@ class ImageSelectionDialog(QDialog):
     def on_row_changed(self, row):
         if 0 <= row < len(self.images):
             self.selected_image = self.images[row]
-            # Structure: (id, note_id, name, data, mime)
-            data = self.selected_image[3]
-            self.preview_label.set_image(data)
+            # Structure: (id, note_id, name, mime, length) - bytes are loaded on demand
+            att_data = self.repo.get_attachment(self.selected_image[0])
+            self.preview_label.set_image(att_data[3] if att_data else None)
         else:
             self.selected_image = None
             self.preview_label.set_image(None)
@@ -12,6 +12,8 @@ class EditorStorageMixin:
         if not note_id:
             return
 
+        # Вставленные картинки, которые ещё кодируются, записываем вместе с заметкой
+        self.editor.flush_pending_images()
         html = self.editor.toHtml()
         cursor_pos = self.editor.textCursor().position()
 
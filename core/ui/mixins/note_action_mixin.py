@@ -294,9 +294,10 @@ class NoteActionMixin:
 
             self.load_notes_tree()
 
-            # Автоматическое сжатие базы после удаления (тихо, без сообщений)
+            # Автоматическое сжатие базы после удаления (тихо, без сообщений):
+            # инкрементально, без полной перестройки файла БД
             try:
-                self.repo.vacuum()
+                self.repo.incremental_vacuum()
             except Exception as e:
                 print(f"Error compacting db: {e}")
 
@@ -26,19 +26,18 @@ class TreeDataMixin:
                 current_selected_id = cur_item.data(0, Qt.UserRole)
 
             self.tree_notes.clear()
-            notes = self.repo.get_all_notes()
-
-            # 1) создаем все item'ы
+            # 1) создаем все item'ы прямо по мере чтения строк из БД
             items_map: dict[int, QTreeWidgetItem] = {}
-            for note_id, parent_id, title, body_html, cursor_pos, updated_at in notes:
+            links: list[tuple[QTreeWidgetItem, int | None]] = []
+            for note_id, parent_id, title, updated_at in self.repo.iter_all_notes_meta():
                 item = QTreeWidgetItem([title])
                 item.setData(0, Qt.UserRole, note_id)
                 items_map[note_id] = item
+                links.append((item, parent_id))
 
             # 2) собираем иерархию (порядок в БД теперь не важен)
             root_items = []
-            for note_id, parent_id, title, body_html, cursor_pos, updated_at in notes:
-                item = items_map[note_id]
+            for item, parent_id in links:
                 if parent_id is None or parent_id not in items_map:
                     root_items.append(item)
                 else:
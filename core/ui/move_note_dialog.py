@@ -48,7 +48,7 @@ class MoveNoteDialog(QDialog):
 
     def _load_tree(self):
         """Загрузка дерева заметок (без перемещаемых заметок и их потомков)"""
-        notes = self.repo.get_all_notes()
+        notes = self.repo.get_all_notes_meta()
 
         # Создаем множество ID заметок, которые нельзя выбрать
         # (сами перемещаемые заметки + их потомки)
@@ -56,7 +56,7 @@ class MoveNoteDialog(QDialog):
         
         # Находим всех потомков перемещаемых заметок
         def add_descendants(parent_id):
-            for note_id, p_id, _, _, _, _ in notes:
+            for note_id, p_id, _, _ in notes:
                 if p_id == parent_id and note_id not in excluded_ids:
                     excluded_ids.add(note_id)
                     add_descendants(note_id)
@@ -66,7 +66,7 @@ class MoveNoteDialog(QDialog):
 
         # Создаем все item'ы (только те, которые не исключены)
         items_map = {}
-        for note_id, parent_id, title, _, _, _ in notes:
+        for note_id, parent_id, title, _ in notes:
             if note_id not in excluded_ids:
                 item = QTreeWidgetItem([title])
                 item.setData(0, Qt.UserRole, note_id)
@@ -74,7 +74,7 @@ class MoveNoteDialog(QDialog):
 
         # Собираем иерархию
         root_items = []
-        for note_id, parent_id, title, _, _, _ in notes:
+        for note_id, parent_id, title, _ in notes:
             if note_id in excluded_ids:
                 continue
             